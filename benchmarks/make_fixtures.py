@@ -0,0 +1,158 @@
+"""
+Regenerate the small fixture dictionary used by the benchmarks, from the full dictionary
+installed for jamdict:
+- a KANJIDIC2 subset with the most frequent kanjis of each grade
+- a JMdict subset with the common entries (having a priority tag) that can be written
+  with these kanjis only
+Both are extracts of the EDRDG dictionaries: they keep the version of their source and
+a notice of its licence (see fixtures/README.md).
+
+Usage: python -m benchmarks.make_fixtures
+"""
+import gzip
+import os
+import re
+from xml.etree import ElementTree
+
+from jamdict import Jamdict
+
+from kanjigame.engine import KANJI_GRADES
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(__file__), "fixtures")
+JMDICT_FIXTURE_FILEPATH = os.path.join(FIXTURES_FOLDER, "JMdict_fixture.xml.gz")
+KANJIDIC2_FIXTURE_FILEPATH = os.path.join(FIXTURES_FOLDER, "kanjidic2_fixture.xml.gz")
+
+NB_KANJIS_PER_GRADE = 20
+LICENCE_NOTICE = (
+    " This file is an extract of {name} ({version}), the property of the Electronic Dictionary"
+    " Research and Development Group (EDRDG), used in conformance with the Group's licence:"
+    " Creative Commons Attribution-ShareAlike 4.0, see https://www.edrdg.org/edrdg/licence.html "
+)
+KANA_RE = re.compile("[぀-ヿー]")
+
+
+def sub_element(parent, tag, text, **attrib):
+    elem = ElementTree.SubElement(parent, tag, attrib)
+    elem.text = str(text)
+    return elem
+
+
+def pick_kanjis(jmd):
+    with jmd.kd2.ctx() as ctx:
+        rows = ctx.select(
+            "SELECT literal, grade FROM character WHERE grade IS NOT NULL AND freq IS NOT NULL "
+            "ORDER BY CAST(freq AS INTEGER), literal")
+    kanjis_by_grade = {grade: [] for grade in KANJI_GRADES}
+    for literal, grade in rows:
+        kanjis = kanjis_by_grade.get(int(grade))
+        if kanjis is not None and len(kanjis) < NB_KANJIS_PER_GRADE:
+            kanjis.append(literal)
+    return [kanji for kanjis in kanjis_by_grade.values() for kanji in kanjis]
+
+
+def dictionary_meta(jmd):
+    with jmd.kd2.ctx() as ctx:
+        return {row["key"]: row["value"] for row in ctx.select("SELECT key, value FROM meta")}
+
+
+def write_kanjidic2(jmd, kanjis, filepath):
+    # The header of the source, as imported by jamdict (only the version for its own data)
+    meta = dictionary_meta(jmd)
+    database_version = meta.get("kanjidic2.database_version", meta.get("kanjidic2.version"))
+    date_of_creation = meta.get("kanjidic2.date_of_creation", meta.get("kanjidic2.date"))
+    root = ElementTree.Element("kanjidic2")
+    header = ElementTree.SubElement(root, "header")
+    sub_element(header, "file_version", meta.get("kanjidic2.file_version", 4))
+    sub_element(header, "database_version", database_version)
+    sub_element(header, "date_of_creation", date_of_creation)
+
+    for kanji in kanjis:
+        char = jmd.get_char(kanji)
+        char_elem = ElementTree.SubElement(root, "character")
+        sub_element(char_elem, "literal", char.literal)
+        misc = ElementTree.SubElement(char_elem, "misc")
+        sub_element(misc, "grade", char.grade)
+        sub_element(misc, "stroke_count", char.stroke_count)
+        sub_element(misc, "freq", char.freq)
+        reading_meaning = ElementTree.SubElement(char_elem, "reading_meaning")
+        for rm_group in char.rm_groups:
+            rm_elem = ElementTree.SubElement(reading_meaning, "rmgroup")
+            for reading in rm_group.readings:
+                if reading.r_type in ("ja_on", "ja_kun"):
+                    sub_element(rm_elem, "reading", reading.value, r_type=reading.r_type)
+            for meaning in rm_group.meanings:
+                attrib = {"m_lang": meaning.m_lang} if meaning.m_lang else {}
+                sub_element(rm_elem, "meaning", meaning.value, **attrib)
+
+    notice = LICENCE_NOTICE.format(
+        name="KANJIDIC2", version=f"database version {database_version}, {date_of_creation}")
+    write_xml(root, filepath, notice)
+
+
+def write_jmdict(jmd, kanjis, filepath):
+    with jmd.jmdict.ctx() as ctx:
+        kanji_rows = ctx.select(
+            "SELECT idseq, text FROM Kanji WHERE ID IN (SELECT kid FROM KJP) ORDER BY idseq")
+    kanjis = set(kanjis)
+    idseqs = sorted({
+        idseq for idseq, text in kanji_rows
+        if all(char in kanjis or KANA_RE.match(char) for char in text)
+    })
+
+    root = ElementTree.Element("JMdict")
+    for idseq in idseqs:
+        entry = jmd.get_entry(idseq)
+        entry_elem = ElementTree.SubElement(root, "entry")
+        sub_element(entry_elem, "ent_seq", entry.idseq)
+        for kanji_form in entry.kanji_forms:
+            k_ele = ElementTree.SubElement(entry_elem, "k_ele")
+            sub_element(k_ele, "keb", kanji_form.text)
+            for pri in kanji_form.pri:
+                sub_element(k_ele, "ke_pri", pri)
+        for kana_form in entry.kana_forms:
+            r_ele = ElementTree.SubElement(entry_elem, "r_ele")
+            sub_element(r_ele, "reb", kana_form.text)
+            if kana_form.nokanji:
+                ElementTree.SubElement(r_ele, "re_nokanji")
+            for restr in kana_form.restr:
+                sub_element(r_ele, "re_restr", restr)
+            for pri in kana_form.pri:
+                sub_element(r_ele, "re_pri", pri)
+        for sense in entry.senses:
+            sense_elem = ElementTree.SubElement(entry_elem, "sense")
+            for pos in sense.pos:
+                sub_element(sense_elem, "pos", pos)
+            for gloss in sense.gloss:
+                attrib = {}
+                if gloss.lang and gloss.lang != "eng":
+                    attrib["xml:lang"] = gloss.lang
+                if gloss.gend:
+                    attrib["g_gend"] = gloss.gend
+                sub_element(sense_elem, "gloss", gloss.text, **attrib)
+
+    meta = dictionary_meta(jmd)
+    notice = LICENCE_NOTICE.format(name="JMdict", version=f"version {meta.get('jmdict.version')}")
+    write_xml(root, filepath, notice)
+    return len(idseqs)
+
+
+def write_xml(root, filepath, notice):
+    # mtime=0 so that regenerating the same fixture gives the same file
+    with open(filepath, "wb") as raw_file:
+        with gzip.GzipFile(fileobj=raw_file, mode="wb", mtime=0) as outfile:
+            outfile.write(b"<?xml version='1.0' encoding='UTF-8'?>\n")
+            outfile.write(f"<!--{notice}-->\n".encode("utf-8"))
+            ElementTree.ElementTree(root).write(outfile, encoding="UTF-8", xml_declaration=False)
+
+
+def main():
+    jmd = Jamdict()
+    os.makedirs(FIXTURES_FOLDER, exist_ok=True)
+    kanjis = pick_kanjis(jmd)
+    write_kanjidic2(jmd, kanjis, KANJIDIC2_FIXTURE_FILEPATH)
+    nb_entries = write_jmdict(jmd, kanjis, JMDICT_FIXTURE_FILEPATH)
+    print(f"Wrote {len(kanjis)} kanjis and {nb_entries} entries to {FIXTURES_FOLDER}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Benchmarks of the game, on the small fixture dictionary and without a display
+(SDL dummy video driver), so that they can run anywhere and be compared between runs.
+
+Measured:
+- cold startup (building the data files) and warm startup (loading them), in fresh processes,
+  with the first turn computed or taken from the warm start snapshot
+- joker search (GameState.find_one_valid_word) for every kanji
+- answer validation (GameState.lookup_word_entries) for every reading, without and with cache,
+  and in batch (GameState.validate_readings) with all the readings at once, in readings/s
+- per-frame render cost of Game.render
+- latency of the answers sent to the game server by many clients at once
+
+Usage: python -m benchmarks.run [--output results.json] [--compare previous_results.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(__file__), "fixtures")
+JMDICT_FIXTURE_FILEPATH = os.path.join(FIXTURES_FOLDER, "JMdict_fixture.xml.gz")
+KANJIDIC2_FIXTURE_FILEPATH = os.path.join(FIXTURES_FOLDER, "kanjidic2_fixture.xml.gz")
+FIXTURE_DB_FILENAME = "jamdict_fixture.db"
+
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT_FILEPATH = "bench_results.json"
+
+NB_WARM_STARTUPS = 3
+NB_FRAMES = 300
+FPS = 30
+NB_BATCH_KANJIS = 20  # Kanjis to validate all the readings against, in one batch each
+NB_SERVER_CLIENTS = 50
+NB_SERVER_REQUESTS = 20  # Per client, each sent as soon as the previous one is answered
+
+
+def fixture_jamdict_kwargs(workdir):
+    db_file = os.path.join(workdir, FIXTURE_DB_FILENAME)
+    return dict(
+        db_file=db_file,
+        kd2_file=db_file,
+        jmd_xml_file=JMDICT_FIXTURE_FILEPATH,
+        kd2_xml_file=KANJIDIC2_FIXTURE_FILEPATH,
+        auto_config=False,
+    )
+
+
+def import_fixture_db(workdir):
+    from jamdict import Jamdict
+
+    kwargs = fixture_jamdict_kwargs(workdir)
+    # Jamdict falls back on the installed dictionary if the database file does not exist yet
+    open(kwargs["db_file"], "w").close()
+    with contextlib.redirect_stdout(io.StringIO()):
+        Jamdict(**kwargs).import_data()
+
+
+def use_fixture(workdir):
+    """Make the game use the fixture dictionary, and a data folder in the workdir"""
+    from kanjigame import dictionary
+
+    dictionary.set_data_folder(os.path.join(workdir, "data"))
+    dictionary.JMD = dictionary.LazyJamdict(**fixture_jamdict_kwargs(workdir))
+
+
+def timing_stats(durations, unit="s"):
+    durations = sorted(durations)
+    return {
+        "unit": unit,
+        "n": len(durations),
+        "mean": statistics.mean(durations),
+        "median": statistics.median(durations),
+        "p95": durations[min(len(durations) - 1, int(0.95 * len(durations)))],
+        "max": durations[-1],
+        "total": sum(durations),
+    }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def measure_startup(workdir):
+    """Run in a fresh process: import the game, load all the resources and start a session"""
+    start = time.perf_counter()
+    from kanjigame import game  # noqa: F401 (import time of the whole game, pygame included)
+    from kanjigame import dictionary, warm_start
+    from kanjigame.engine import CONFS, GameState
+    import_s = time.perf_counter() - start
+
+    use_fixture(workdir)
+    resources_s = {resource.name: timed(resource.get) for resource in dictionary.RESOURCES}
+
+    def first_turn_from_snapshot():
+        snapshot = warm_start.load_snapshot()
+        GameState(CONFS["Normal"], start=warm_start.snapshot_game_start(snapshot, "Normal"))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        first_turn_s = timed(GameState, CONFS["Normal"])
+        # Computed from scratch on a cold startup: the snapshot is written for the next ones
+        first_turn_snapshot_s = timed(first_turn_from_snapshot)
+        if warm_start.load_snapshot() is None:
+            warm_start.write_snapshot(None)
+
+    return {
+        "import": import_s,
+        "resources": resources_s,
+        "first_turn": first_turn_s,
+        "first_turn_snapshot": first_turn_snapshot_s,
+        "total": time.perf_counter() - start,
+    }
+
+
+def run_startup(workdir):
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--startup", workdir],
+        cwd=REPO_FOLDER, check=True, stdout=subprocess.PIPE, universal_newlines=True,
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+    result["process"] = time.perf_counter() - start
+    return result
+
+
+def bench_startup(workdir, results):
+    cold = run_startup(workdir)
+    warms = [run_startup(workdir) for _ in range(NB_WARM_STARTUPS)]
+
+    warm = min(warms, key=lambda startup: startup["total"])
+    for name, startup in [("startup_cold", cold), ("startup_warm", warm)]:
+        results[f"{name}.process"] = timing_stats([startup["process"]])
+        results[f"{name}.import"] = timing_stats([startup["import"]])
+        for resource_name, duration in startup["resources"].items():
+            results[f"{name}.resource.{resource_name}"] = timing_stats([duration])
+        results[f"{name}.first_turn"] = timing_stats([startup["first_turn"]])
+        results[f"{name}.first_turn_snapshot"] = timing_stats([startup["first_turn_snapshot"]])
+
+
+def new_state(conf_name="Hard"):
+    from kanjigame.engine import CONFS, GameState
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        state = GameState(CONFS[conf_name])
+    state.verbose = False
+    return state
+
+
+def bench_joker_search(results):
+    state = new_state()
+    durations = []
+    for kanji in sorted(state.valid_kanjis):
+        state.kanji_to_match = kanji
+        durations.append(timed(state.find_one_valid_word))
+    results["joker_search.per_kanji"] = timing_stats(durations)
+
+
+def bench_validation(results):
+    from kanjigame import dictionary
+
+    state = new_state()
+    reading_to_words = dictionary.READING_TO_WORDS.get()
+    # Pick a kanji of the first word of each reading, for the answer to be valid
+    cases = []
+    for reading in sorted(reading_to_words):
+        kanjis = state.get_word_kanjis(reading_to_words[reading][0].word)
+        if kanjis:
+            cases.append((reading, kanjis[0]))
+
+    for name in ("uncached", "cached"):
+        if name == "uncached":
+            dictionary.ENTRY_CACHE.values.clear()
+        durations = []
+        for reading, kanji in cases:
+            state.kanji_to_match = kanji
+            durations.append(timed(state.lookup_word_entries, reading))
+        results[f"validation.per_reading.{name}"] = timing_stats(durations)
+
+    readings = [reading for reading, _ in cases]
+    kanjis = sorted({kanji for _, kanji in cases})
+    durations = []
+    for kanji in random.Random(0).sample(kanjis, min(NB_BATCH_KANJIS, len(kanjis))):
+        state.kanji_to_match = kanji
+        durations.append(timed(state.validate_readings, readings) / len(readings))
+    stats = timing_stats(durations)
+    stats["throughput"] = 1 / stats["mean"]
+    results["validation.batch.per_reading"] = stats
+
+    durations = [timed(dictionary.word_to_freqrank, record.word)
+                 for records in reading_to_words.values() for record in records]
+    results["word_to_freqrank.per_word"] = timing_stats(durations)
+
+
+def new_game():
+    import pygame
+    from kanjigame import game
+
+    pygame.init()
+    try:
+        game.get_font_family()
+        font = "japanese"
+    except Exception:
+        # Without Japanese fonts the glyphs are placeholders, costs stay comparable
+        game.get_font_path = lambda: None
+        font = "default"
+
+    pygame.display.set_mode((1024, 768))
+    # Pick the first difficulty in the options screen
+    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN, unicode="\r"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        g = game.Game()
+    g.state.verbose = False
+    g.validated_user_input = None
+    return g, font
+
+
+def bench_frames(results, meta):
+    g, meta["font"] = new_game()
+    g.render()
+
+    def idle():
+        pass
+
+    def timer():
+        g.state.timer -= 1 / FPS
+
+    def typing():
+        if len(g.kana_input.romaji) == 8:
+            g.kana_input.clear()
+        g.kana_input.append(random.choice("aiueo"))
+
+    def full_redraw():
+        g.full_redraw = True
+
+    for name, before_frame in [("idle", idle), ("timer", timer), ("typing", typing),
+                               ("full_redraw", full_redraw)]:
+        g.state.timer = g.state.conf["MAX_TIMER"]
+        durations = []
+        for _ in range(NB_FRAMES):
+            before_frame()
+            durations.append(timed(g.render))
+        results[f"frame.{name}"] = timing_stats(durations)
+
+    import pygame
+    pygame.quit()
+
+
+def bench_server(results):
+    import asyncio
+    from kanjigame import dictionary, server
+
+    readings = sorted(dictionary.READING_TO_WORDS.get())
+
+    async def client(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        await reader.readline()  # Hello
+        state = {"running": False}
+        for _ in range(NB_SERVER_REQUESTS):
+            if not state["running"]:
+                request = {"cmd": "start", "difficulty": "Easy"}
+            elif random.random() < 0.2:
+                request = {"cmd": "give_up"}
+            else:
+                request = {"cmd": "answer", "reading": random.choice(readings)}
+            writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            await writer.drain()
+            state = json.loads(await reader.readline())
+        writer.close()
+        await writer.wait_closed()
+
+    async def run():
+        game_server = server.GameServer(port=0)
+        await game_server.start()
+        await asyncio.gather(*[client(game_server.port) for _ in range(NB_SERVER_CLIENTS)])
+        if game_server.connections:
+            # Disconnected: let the tasks of the clients end, as in GameServer.serve_forever
+            await asyncio.wait(list(game_server.connections))
+        game_server.close()
+        return game_server
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        game_server = asyncio.run(run())
+    results["server.per_answer"] = timing_stats(list(game_server.answer_latencies.recent))
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_FOLDER, check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks():
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    random.seed(0)
+
+    import pygame
+
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+    }
+    results = {}
+
+    workdir = tempfile.mkdtemp(prefix="kanjigame-bench-")
+    try:
+        import_fixture_db(workdir)
+        bench_startup(workdir, results)
+
+        use_fixture(workdir)
+        from kanjigame.dictionary import load_resources
+        load_resources()
+
+        bench_joker_search(results)
+        bench_validation(results)
+        bench_frames(results, meta)
+        bench_server(results)
+    finally:
+        shutil.rmtree(workdir)
+
+    return {"meta": meta, "results": results}
+
+
+def print_results(results, previous_results=None):
+    for name, stats in results.items():
+        line = f"{name:<60} mean {stats['mean'] * 1000:9.3f}ms  p95 {stats['p95'] * 1000:9.3f}ms"
+        previous_stats = (previous_results or {}).get(name)
+        if previous_stats and previous_stats["mean"]:
+            line += f"  ({stats['mean'] / previous_stats['mean']:.2f}x)"
+        if "throughput" in stats:
+            line += f"  {stats['throughput']:.0f}/s"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the kanji game")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_FILEPATH,
+                        help="JSON file to write the results to")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    parser.add_argument("--startup", metavar="WORKDIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.startup:
+        # Child process of bench_startup
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = measure_startup(args.startup)
+        print(json.dumps(result))
+        return
+
+    previous_results = None
+    if args.compare:
+        with open(args.compare) as infile:
+            previous_results = json.load(infile)["results"]
+
+    run = run_benchmarks()
+    print_results(run["results"], previous_results)
+
+    with open(args.output, "w") as outfile:
+        json.dump(run, outfile, indent=2, ensure_ascii=False)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,14 @@
 set -e
 
 DATAFOLDER="$HOME/.jamdict/data"
-mkdir -p $DATAFOLDER
+mkdir -p "$DATAFOLDER"
 
-wget -O $DATAFOLDER/JMdict_e.gz http://ftp.monash.edu/pub/nihongo/JMdict_e.gz
-wget -O $DATAFOLDER/kanjidic2.xml.gz http://www.edrdg.org/kanjidic/kanjidic2.xml.gz
+wget -O "$DATAFOLDER/JMdict_e.gz" http://ftp.monash.edu/pub/nihongo/JMdict_e.gz
+wget -O "$DATAFOLDER/kanjidic2.xml.gz" http://www.edrdg.org/kanjidic/kanjidic2.xml.gz
 
 python3 -m jamdict.tools import
+
+# Precompute the indexes of the game from the new dictionary (from the repository, wherever
+# the script is run from)
+cd "$(dirname "$0")"
+python3 -m kanjigame build-data
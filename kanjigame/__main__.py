@@ -1,4 +1,64 @@
-from .game import main
+import argparse
+import os
+
+from .profiler import PROFILE_FILEPATH, StartupTimer
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m kanjigame", description="Kanji game")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"time the phases of each frame, and write a summary to "
+                             f"'{PROFILE_FILEPATH}' on exit")
+    parser.add_argument("--profile-overlay", action="store_true",
+                        help="show the frame rate and latencies on screen (implies --profile)")
+    parser.add_argument("--data-folder",
+                        help="folder of the data pack, the chains and the warm start snapshot "
+                             "(default: $KANJIGAME_DATA_FOLDER, or ~/.jamdict/kanjigame)")
+    subparsers = parser.add_subparsers(dest="command", metavar="command",
+                                       help="without a command, play the game")
+    subparsers.add_parser("build-data",
+                          help="build the data pack of the game from the dictionary "
+                               "(also done when the game starts, if the dictionary changed)")
+    serve_parser = subparsers.add_parser("serve", help="host games over TCP (JSON lines), "
+                                                       "for many players at once")
+    # Defaults in kanjigame/server.py, not imported here for the game to start faster
+    serve_parser.add_argument("--host", help="address to listen to (default: SERVER_HOST)")
+    serve_parser.add_argument("--port", type=int, help="port to listen to (default: SERVER_PORT)")
+    serve_parser.add_argument("--workers", type=int,
+                              help="threads doing the dictionary work, in each process "
+                                   "(default: DICTIONARY_WORKERS)")
+    serve_parser.add_argument("--processes", type=int,
+                              help="processes serving the players, e.g. one per core "
+                                   "(Unix only, default: SERVER_PROCESSES)")
+    solve_parser = subparsers.add_parser("solve", help="search the longest and highest-scoring "
+                                                       "chains of words of each grade")
+    # Defaults in kanjigame/chains.py
+    solve_parser.add_argument("--grades", type=int, nargs="+",
+                              help="target kanji grades to solve (default: all)")
+    solve_parser.add_argument("--processes", type=int,
+                              help="processes searching the chains (default: one per core)")
+    solve_parser.add_argument("--max-states", type=int,
+                              help="states searched from each first kanji "
+                                   "(default: SOLVER_MAX_STATES)")
+    args = parser.parse_args()
+    if args.data_folder:
+        # Read when kanjigame.dictionary is imported, here and in the processes started from here
+        os.environ["KANJIGAME_DATA_FOLDER"] = args.data_folder
+
+    if args.command == "build-data":
+        from .dictionary import build_data_pack
+        build_data_pack()
+    elif args.command == "serve":
+        from .server import serve
+        serve(args.host, args.port, args.workers, args.processes)
+    elif args.command == "solve":
+        from .chains import solve
+        solve(args.grades, args.processes, args.max_states)
+    else:
+        startup = StartupTimer()
+        from .game import main as play
+        startup.end_phase("imports")
+        play(profile=args.profile, profile_overlay=args.profile_overlay, startup=startup)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,339 @@
+"""
+Offline chain solver: the longest and the highest-scoring chains of words of each grade,
+to tune the CONFS and to give the players a target chain to beat.
+
+A chain is what a player gets by answering every kanji without a mistake: each word contains
+the kanji to match, and the next kanji comes from that word (see GameState.add_word).
+Only the steps where the game has a single choice for the next kanji are followed,
+so that the chain can be played as is; the last word can be any valid word not played yet.
+Chains are scored as GameState.compute_score_update does, answering before the hint.
+
+The graph of each grade links each candidate kanji to the next kanjis its words lead to.
+Longest paths are searched depth first from each first kanji, on a process pool:
+- the words leading to the same next kanji are reduced to the best scoring one, and the last
+  words are only scored when they can beat the best chain
+- the next kanjis with the fewest ways out are tried first, as long paths go through them
+- a branch is pruned if all the kanjis it can still reach can't beat the best chain
+- a (kanji, cleared kanjis) state reached before with a better score is not searched again
+- the search of a first kanji stops after SOLVER_MAX_STATES states
+"""
+import json
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from . import dictionary, engine
+from .dictionary import kanji_info, kanji_word_ids, word_table
+from .engine import KANJI_GRADE_TO_INFO, KANJI_GRADES
+
+CHAINS_FILENAME = "chains.json"  # In the data folder
+CHAINS_VERSION = 2  # To increase when the content of the results changes
+SOLVER_MAX_STATES = 5000  # States searched from each first kanji, the search stops there
+SOLVER_RANKED_WORDS_ONLY = True  # If True, only use words having a frequency rank
+NO_HINT_MULTIPLIER = 2  # See GameState.compute_score_update
+
+# A move from a kanji: the word played, the kanji it leads to (-1 if none, or if it depends
+# on the kanjis cleared), the score of its kanjis that don't depend on the chain,
+# and (kanji, score) of its other candidate kanjis, that only score once cleared
+Move = namedtuple("Move", ["word_id", "next_kanji", "static_score", "candidate_scores"])
+# The result of a search, the words are given with the first kanji
+Chain = namedtuple("Chain", ["length", "score", "first_kanji", "words"])
+
+_GRAPHS = {}  # Target grade -> ChainGraph, built once by each process
+
+
+class ChainGraph:
+    """Candidate kanjis of a grade (by index), and the moves from each of them"""
+
+    def __init__(self, target_grade):
+        # Moves of each kanji (by index) are kept as:
+        # - moves: all of them, for the last word of a chain
+        # - next_words: next kanji -> (score, word id) of the best word only leading to it
+        # - other_moves: the moves leading to one of several kanjis, depending on the ones cleared
+        valid_kanjis, _, candidate_kanjis = engine.candidate_kanjis_sets(target_grade)
+        self.kanjis = sorted(candidate_kanjis)
+        kanji_idx = {kanji: idx for idx, kanji in enumerate(self.kanjis)}
+        _word_table = word_table()
+
+        def grade_score(char):
+            return KANJI_GRADE_TO_INFO[kanji_info(char).grade]["score"]
+
+        self.moves = []
+        self.next_words = []
+        self.other_moves = []
+        self.neighbors = []  # Bitmask of the kanjis the words of each kanji lead to
+        self.max_move_scores = []  # Highest score of the words of each kanji
+        for idx, kanji in enumerate(self.kanjis):
+            moves = []
+            next_words = {}
+            other_moves = []
+            neighbors = 0
+            for word_id in kanji_word_ids(kanji):
+                if SOLVER_RANKED_WORDS_ONLY and not _word_table.is_ranked(word_id):
+                    break
+                word = _word_table.word(word_id)
+                if not engine.valid_word_candidate(word, kanji, valid_kanjis)[0]:
+                    continue
+                static_score = 0
+                candidate_scores = []
+                for char in word:
+                    if char == kanji or (char in valid_kanjis and char not in kanji_idx):
+                        static_score += grade_score(char)
+                    elif char in kanji_idx:
+                        candidate_scores.append((kanji_idx[char], grade_score(char)))
+                next_kanjis = {char_idx for char_idx, _ in candidate_scores}
+                if engine.MATCH_LAST_KANJI:
+                    next_kanjis = {kanji_idx[word[-1]]} if word[-1] in kanji_idx else set()
+                for next_idx in next_kanjis:
+                    neighbors |= 1 << next_idx
+                # Several kanjis to go to: decided when searching, once some are cleared
+                next_kanji = next_kanjis.pop() if len(next_kanjis) == 1 else -1
+                move = Move(word_id, next_kanji, static_score, tuple(candidate_scores))
+                moves.append(move)
+                if next_kanji >= 0 and all(char_idx == next_kanji
+                                           for char_idx, _ in candidate_scores):
+                    # Its score can't change: the next kanji is not cleared yet
+                    if static_score > next_words.get(next_kanji, (-1, None))[0]:
+                        next_words[next_kanji] = (static_score, word_id)
+                elif candidate_scores:
+                    other_moves.append(move)
+            self.moves.append(moves)
+            self.next_words.append(next_words)
+            self.other_moves.append(other_moves)
+            self.neighbors.append(neighbors)
+            self.max_move_scores.append(max(
+                (move.static_score + sum(score for _, score in move.candidate_scores)
+                 for move in moves), default=0))
+        self.max_word_score = max(self.max_move_scores, default=0)
+
+    def next_kanji(self, move, cleared):
+        """Kanji the move leads to once the given kanjis are cleared, -1 if not a single one"""
+        if engine.MATCH_LAST_KANJI or move.next_kanji >= 0:
+            next_idx = move.next_kanji
+        else:
+            next_kanjis = {idx for idx, _ in move.candidate_scores if not cleared >> idx & 1}
+            next_idx = next_kanjis.pop() if len(next_kanjis) == 1 else -1
+        if next_idx < 0 or cleared >> next_idx & 1:
+            return -1
+        return next_idx
+
+    def reachable(self, kanji_idx, cleared):
+        """Number of kanjis not cleared yet that can be reached from the given one"""
+        reached = 0
+        frontier = self.neighbors[kanji_idx] & ~cleared
+        while frontier:
+            reached |= frontier
+            new_frontier = 0
+            while frontier:
+                low_bit = frontier & -frontier
+                new_frontier |= self.neighbors[low_bit.bit_length() - 1]
+                frontier ^= low_bit
+            frontier = new_frontier & ~cleared & ~reached
+        return bin(reached).count("1")
+
+
+def chain_graph(target_grade) -> ChainGraph:
+    if target_grade not in _GRAPHS:
+        _GRAPHS[target_grade] = ChainGraph(target_grade)
+    return _GRAPHS[target_grade]
+
+
+def move_score(move, cleared):
+    return move.static_score + sum(score for idx, score in move.candidate_scores
+                                   if cleared >> idx & 1)
+
+
+def search_chains(target_grade, first_kanji, max_states=SOLVER_MAX_STATES):
+    """
+    Longest and highest-scoring chains starting with the given kanji:
+    returns (longest, best scoring, exhaustive), exhaustive if the search did not stop early
+    """
+    graph = chain_graph(target_grade)
+    _word_table = word_table()
+    first_idx = graph.kanjis.index(first_kanji)
+    # One recursion level per word of the chain
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), len(graph.kanjis) + 100))
+    best = {"length": (0, 0, []), "score": (0, 0, [])}  # (length, score, word ids)
+    seen = {}  # (kanji, cleared kanjis) -> best score reaching it
+    word_ids = []  # Of the chain being searched
+    used_word_ids = set()  # The same, the game does not accept a word twice
+    nb_states = 0
+
+    def visit(kanji_idx, cleared, nb_words, score):
+        nonlocal nb_states
+        nb_states += 1
+        combo = nb_words + 1
+        multiplier = NO_HINT_MULTIPLIER * combo
+
+        # Best last word from here
+        moves = graph.moves[kanji_idx]
+        max_score = score + multiplier * graph.max_move_scores[kanji_idx]
+        if moves and (combo >= best["length"][0] or max_score > best["score"][1]):
+            move = max((move for move in moves if move.word_id not in used_word_ids),
+                       key=lambda move: move_score(move, cleared), default=None)
+        else:
+            move = None
+        if move is not None:
+            chain_score = score + multiplier * move_score(move, cleared)
+            if (combo, chain_score) > best["length"][:2]:
+                best["length"] = (combo, chain_score, word_ids + [move.word_id])
+            if chain_score > best["score"][1]:
+                best["score"] = (combo, chain_score, word_ids + [move.word_id])
+
+        # Best word leading to each next kanji
+        children = {next_idx: (multiplier * word_score, word_id)
+                    for next_idx, (word_score, word_id) in graph.next_words[kanji_idx].items()
+                    if not cleared >> next_idx & 1}
+        for move in graph.other_moves[kanji_idx]:
+            next_idx = graph.next_kanji(move, cleared)
+            if next_idx < 0:
+                continue
+            word_score = multiplier * move_score(move, cleared)
+            if next_idx not in children or word_score > children[next_idx][0]:
+                children[next_idx] = (word_score, move.word_id)
+
+        def nb_ways_out(next_idx):
+            return bin(graph.neighbors[next_idx] & ~cleared).count("1")
+
+        for next_idx in sorted(children, key=nb_ways_out):
+            if nb_states >= max_states:
+                return
+            word_score, word_id = children[next_idx]
+            next_cleared = cleared | 1 << next_idx
+            next_score = score + word_score
+            key = (next_idx, next_cleared)
+            if seen.get(key, -1) >= next_score:
+                continue
+            seen[key] = next_score
+            # At most one word per kanji still reachable, then a last word
+            max_length = combo + graph.reachable(next_idx, next_cleared) + 1
+            max_score = next_score + NO_HINT_MULTIPLIER * graph.max_word_score * sum(
+                range(combo + 1, max_length + 1))
+            if max_length <= best["length"][0] and max_score <= best["score"][1]:
+                continue
+            word_ids.append(word_id)
+            used_word_ids.add(word_id)
+            visit(next_idx, next_cleared, combo, next_score)
+            used_word_ids.discard(word_id)
+            word_ids.pop()
+
+    visit(first_idx, 1 << first_idx, 0, 0)
+
+    def to_chain(result):
+        length, score, word_ids = result
+        words = [_word_table.word(word_id) for word_id in word_ids]
+        return Chain(length, score, first_kanji, words)
+
+    return to_chain(best["length"]), to_chain(best["score"]), nb_states < max_states
+
+
+def chain_text(chain, nb_words=8):
+    words = " → ".join(chain.words[:nb_words])
+    if len(chain.words) > nb_words:
+        words += " → ..."
+    return f"{chain.length} words, {chain.score} points ({chain.first_kanji}: {words})"
+
+
+def chain_to_json(chain):
+    return {"length": chain.length, "score": chain.score, "first_kanji": chain.first_kanji,
+            "words": chain.words}
+
+
+def solve(grades=None, nb_processes=None, max_states=None, filepath=None):
+    """
+    Search the chains of each target grade (all by default), and write them to filepath.
+    nb_processes defaults to the number of cores, max_states to SOLVER_MAX_STATES,
+    filepath to CHAINS_FILENAME in the data folder.
+    """
+    filepath = filepath or dictionary.data_filepath(CHAINS_FILENAME)
+    grades = KANJI_GRADES if not grades else grades
+    max_states = SOLVER_MAX_STATES if max_states is None else max_states
+    for grade in grades:
+        if grade not in KANJI_GRADES:
+            raise Exception(f"Grade {grade} is not used in the game !")
+    dictionary.load_resources()
+    # The other grades solved before are kept
+    previous_chains = load_chains(filepath)
+    results = previous_chains["grades"] if previous_chains else {}
+    with ProcessPoolExecutor(max_workers=nb_processes) as executor:
+        for grade in grades:
+            kanjis = chain_graph(grade).kanjis
+            print(f"Searching the chains of grade {grade} from {len(kanjis)} kanjis")
+            longest = best_score = None
+            exhaustive = True
+            for chain, scoring_chain, kanji_exhaustive in executor.map(
+                    search_chains, [grade] * len(kanjis), kanjis, [max_states] * len(kanjis),
+                    chunksize=8):
+                if longest is None or chain[:2] > longest[:2]:
+                    longest = chain
+                if best_score is None or scoring_chain.score > best_score.score:
+                    best_score = scoring_chain
+                exhaustive = exhaustive and kanji_exhaustive
+            print(f"- longest chain: {chain_text(longest)}")
+            print(f"- best score: {chain_text(best_score)}")
+            if not exhaustive:
+                print(f"  (search stopped at {max_states} states for some kanjis: "
+                      f"there may be better chains)")
+            results[str(grade)] = {
+                "nb_kanjis": len(kanjis),
+                "exhaustive": exhaustive,
+                "longest": chain_to_json(longest),
+                "best_score": chain_to_json(best_score),
+            }
+
+    pack = dictionary.DATA_PACK.get()
+    chains = {
+        "version": CHAINS_VERSION,
+        "data": data_key(pack),
+        "settings": solver_settings(),
+        "grades": results,
+    }
+    dictionary.ensure_data_folder()
+    tmp_filepath = filepath + ".tmp"
+    with open(tmp_filepath, "w") as outfile:
+        json.dump(chains, outfile, indent=2, ensure_ascii=False)
+    os.replace(tmp_filepath, filepath)
+    print(f"Chains written to {filepath}")
+
+
+def solver_settings():
+    """Settings of the game and of the solver the chains depend on"""
+    return {
+        "match_last_kanji": engine.MATCH_LAST_KANJI,
+        "words_min_nb_kanji": engine.WORDS_MIN_NB_KANJI,
+        "words_min_length": engine.WORDS_MIN_LENGTH,
+        "ranked_words_only": SOLVER_RANKED_WORDS_ONLY,
+    }
+
+
+def data_key(pack):
+    return [pack.data_version, pack.source_fingerprint.hex()]
+
+
+def load_chains(filepath=None) -> Optional[dict]:
+    """Chains of each grade found by the solver, None if not solved for this data and settings"""
+    filepath = filepath or dictionary.data_filepath(CHAINS_FILENAME)
+    try:
+        with open(filepath, encoding="utf-8") as infile:
+            chains = json.load(infile)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"Ignoring the chains ({e!r})")
+        return None
+    if (
+            chains.get("version") != CHAINS_VERSION
+            or chains["settings"] != solver_settings()
+            or chains["data"] != data_key(dictionary.DATA_PACK.get())
+    ):
+        return None
+    return chains
+
+
+def target_chain(target_grade, chains) -> Optional[Chain]:
+    """Longest chain of the grade, for the players to beat, None if unknown"""
+    if chains is None or str(target_grade) not in chains["grades"]:
+        return None
+    return Chain(**chains["grades"][str(target_grade)]["longest"])
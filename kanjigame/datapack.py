@@ -0,0 +1,93 @@
+import mmap
+import os
+import struct
+import zlib
+
+MAGIC = b"KGDP"
+FORMAT_VERSION = 1
+# Magic, format version, data version, source fingerprint, payload checksum, number of sections
+HEADER = struct.Struct("<4sII32sII")
+SECTION = struct.Struct("<32sQQ")  # name, offset, size
+ALIGNMENT = 8
+
+
+class StaleDataPack(Exception):
+    """The data pack is missing, corrupted, or was built from other sources or code"""
+
+
+class DataPack:
+    """
+    Named binary sections (string tables, arrays, pickles...) of the data derived from
+    the dictionary, stored in a single file opened with one mmap.
+
+    Layout (little endian):
+        header | section table: (name, offset, size)[n] | sections, aligned on 8 bytes
+    The header has the version of the data, a fingerprint of the source dictionary files
+    to tell when to rebuild it, and a CRC32 of everything after the header. The CRC32 is only
+    checked on demand (once the pack is built): reading it would load every page at startup.
+    """
+
+    def __init__(self, sections, data_version=0, source_fingerprint=b""):
+        self.sections = sections  # name -> buffer
+        self.data_version = data_version
+        self.source_fingerprint = source_fingerprint
+
+    def section(self, name):
+        return memoryview(self.sections[name])
+
+    @classmethod
+    def open(cls, filepath, data_version, source_fingerprint, verify=False):
+        """
+        Open the data pack, raise StaleDataPack if it has to be built again.
+        verify: also check the checksum of the whole content.
+        """
+        try:
+            with open(filepath, "rb") as infile:
+                buffer = memoryview(mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ))
+        except (FileNotFoundError, ValueError):  # ValueError: empty file
+            raise StaleDataPack("no data pack")
+
+        if len(buffer) < HEADER.size:
+            raise StaleDataPack("truncated data pack")
+        magic, format_version, pack_data_version, pack_fingerprint, checksum, nb_sections = \
+            HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise StaleDataPack("unknown data pack format")
+        if pack_data_version != data_version:
+            raise StaleDataPack(f"data version {pack_data_version} instead of {data_version}")
+        if pack_fingerprint != source_fingerprint:
+            raise StaleDataPack("the dictionary changed")
+        if verify and zlib.crc32(buffer[HEADER.size:]) != checksum:
+            raise StaleDataPack("corrupted data pack")
+
+        if len(buffer) < HEADER.size + nb_sections * SECTION.size:
+            raise StaleDataPack("truncated data pack")
+        sections = {}
+        for idx in range(nb_sections):
+            raw_name, offset, size = SECTION.unpack_from(buffer, HEADER.size + idx * SECTION.size)
+            if offset + size > len(buffer):
+                raise StaleDataPack("truncated data pack")
+            sections[raw_name.rstrip(b"\0").decode("utf-8")] = buffer[offset:offset + size]
+        return cls(sections, data_version, source_fingerprint)
+
+
+def write(filepath, sections, data_version, source_fingerprint):
+    """Write the {name: bytes-like} sections to a data pack, replacing the file at once"""
+    offset = HEADER.size + len(sections) * SECTION.size
+    table = bytearray()
+    payload = bytearray()
+    for name, data in sections.items():
+        padding = -(offset + len(payload)) % ALIGNMENT
+        payload += bytes(padding)
+        table += SECTION.pack(name.encode("utf-8"), offset + len(payload), len(data))
+        payload += data
+
+    body = bytes(table) + bytes(payload)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, data_version, source_fingerprint,
+                         zlib.crc32(body), len(sections))
+    tmp_filepath = filepath + ".tmp"
+    with open(tmp_filepath, "wb") as outfile:
+        outfile.write(header)
+        outfile.write(body)
+    # Readers either see the previous pack or the new one, never a partial one
+    os.replace(tmp_filepath, filepath)
@@ -0,0 +1,741 @@
+import gzip
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict, namedtuple
+from collections.abc import Mapping
+from itertools import chain
+from typing import Optional
+from xml.etree import ElementTree
+
+from . import datapack, stringtable
+
+
+class LazyJamdict:
+    """
+    Jamdict created on first use.
+    There is one instance per thread, as its SQLite connection cannot be shared between threads.
+    jamdict itself is only imported then, as the game can start without it (see warm_start.py).
+    The keyword arguments are passed to Jamdict, e.g. to use another database.
+    """
+
+    def __init__(self, **jamdict_kwargs):
+        self._jamdict_kwargs = jamdict_kwargs
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        jmd = getattr(self._local, "jmd", None)
+        if jmd is None:
+            from jamdict import Jamdict
+            jmd = self._local.jmd = Jamdict(**self._jamdict_kwargs)
+        return getattr(jmd, name)
+
+    def reset(self):
+        """Create new Jamdict instances on next use, e.g. in a forked process"""
+        self._local = threading.local()
+
+
+class LazyResource:
+    """Value built on first access (thread-safe), typically an index read from the data folder"""
+
+    def __init__(self, name, load):
+        self.name = name
+        self._load = load
+        # Reentrant: building the data pack loads the resources it depends on
+        self._lock = threading.RLock()
+        self._value = None
+
+    @property
+    def loaded(self):
+        return self._value is not None
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._load()
+        return self._value
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def reset(self):
+        """Load the value again on next access"""
+        self.set(None)
+
+
+JMD = LazyJamdict()
+
+# Shared by every working directory: next to the dictionaries downloaded by download_dicts.sh,
+# unless KANJIGAME_DATA_FOLDER is set, or overridden with set_data_folder
+DATA_FOLDER = os.environ.get("KANJIGAME_DATA_FOLDER") or os.path.join(
+    os.environ.get("JAMDICT_HOME") or os.path.expanduser(os.path.join("~", ".jamdict")),
+    "kanjigame",
+)
+
+# All the indexes derived from the dictionary, see build_data_pack
+DATA_PACK_FILENAME = "kanjigame.pack"
+DATA_VERSION = 4  # To increase when the content of the data pack changes
+# Legacy plain text version of the frequency ranks, one word per line,
+# only used without the JMdict XML file
+WORDS_FREQ_TXT_FILENAME = "nf_words_freq"
+
+
+def iter_jmdict_word_priorities(filepath):
+    """
+    Stream (word, priority tags) pairs for every kanji and kana form of a JMdict XML file
+    (possibly gzipped), without ever loading the whole dictionary in memory
+    """
+    opener = gzip.open if filepath.endswith(".gz") else open
+    with opener(filepath, "rb") as infile:
+        context = ElementTree.iterparse(infile, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end":
+                continue
+            if elem.tag == "k_ele":
+                yield elem.findtext("keb"), [pri.text for pri in elem.iterfind("ke_pri")]
+            elif elem.tag == "r_ele":
+                yield elem.findtext("reb"), [pri.text for pri in elem.iterfind("re_pri")]
+            elif elem.tag == "entry":
+                # Drop the parsed entries, so that memory does not grow with the file
+                root.clear()
+
+
+def set_data_folder(folder):
+    """Read and write the data of the game in this folder instead"""
+    global DATA_FOLDER
+    DATA_FOLDER = folder
+
+
+def data_filepath(filename):
+    return os.path.join(DATA_FOLDER, filename)
+
+
+def ensure_data_folder():
+    os.makedirs(DATA_FOLDER, exist_ok=True)
+
+
+def read_jmdict_word_frequencies(filepath):
+    nf_to_kanjis = defaultdict(set)
+    for word, pris in iter_jmdict_word_priorities(filepath):
+        for pri in pris:
+            if pri.startswith('nf'):
+                nf_x = int(pri[-2:])
+                nf_to_kanjis[nf_x].add(word)
+
+    _word_to_freqrank = {}
+    ranked_words = (word for nf_x in sorted(nf_to_kanjis.keys()) for word in nf_to_kanjis[nf_x])
+    for idx, word in enumerate(ranked_words):
+        _word_to_freqrank[word] = idx
+    return _word_to_freqrank
+
+
+def read_word_frequency_txt_file(txt_filepath):
+    _word_to_freqrank = {}
+    with open(txt_filepath) as infile:
+        for idx, line in enumerate(infile):
+            word = line.rstrip()
+            _word_to_freqrank[word] = idx
+    return _word_to_freqrank
+
+
+def build_word_frequency():
+    print("Building the word frequencies")
+    if JMD.jmd_xml_file and os.path.exists(JMD.jmd_xml_file):
+        _word_to_freqrank = read_jmdict_word_frequencies(JMD.jmd_xml_file)
+    elif os.path.exists(data_filepath(WORDS_FREQ_TXT_FILENAME)):
+        _word_to_freqrank = read_word_frequency_txt_file(data_filepath(WORDS_FREQ_TXT_FILENAME))
+    else:
+        raise Exception(f"No JMdict XML file to get the word frequencies from ! "
+                        f"({JMD.jmd_xml_file})")
+    return {"words_freqrank": stringtable.to_bytes(_word_to_freqrank)}
+
+
+def gen_word_to_freqrank():
+    return stringtable.StringTable(data_section("words_freqrank"))
+
+
+def word_to_freqrank(word):
+    return WORD_TO_FREQRANK.get().get(word, sys.maxsize)
+
+
+KanjiInfo = namedtuple("KanjiInfo", ["grade", "meaning", "on_readings", "kun_readings"])
+
+
+def build_kanji_info():
+    """Extract the grade, English meanings and readings of every graded kanji from KANJIDIC2"""
+    print("Building the kanji info table")
+    with JMD.kd2.ctx() as ctx:
+        characters = ctx.select(
+            "SELECT ID, literal, grade FROM character WHERE grade IS NOT NULL")
+        # Like jamdict's Character.rm_groups[0], only the first group of each kanji is used
+        cid_to_gid = {
+            row[1]: row[0] for row in ctx.select("SELECT MIN(ID), cid FROM rm_group GROUP BY cid")
+        }
+        gid_to_meanings = defaultdict(list)
+        for gid, value in ctx.select(
+                "SELECT gid, value FROM meaning WHERE m_lang = '' ORDER BY rowid"):
+            gid_to_meanings[gid].append(value)
+        gid_to_readings = defaultdict(lambda: defaultdict(list))
+        for gid, r_type, value in ctx.select(
+                "SELECT gid, r_type, value FROM reading "
+                "WHERE r_type IN ('ja_on', 'ja_kun') ORDER BY rowid"):
+            gid_to_readings[gid][r_type].append(value)
+
+    _kanji_info = {}
+    for cid, literal, grade in characters:
+        gid = cid_to_gid.get(cid)
+        readings = gid_to_readings[gid]
+        _kanji_info[literal] = KanjiInfo(
+            grade=int(grade),
+            meaning=", ".join(gid_to_meanings[gid]),
+            on_readings=tuple(readings["ja_on"]),
+            kun_readings=tuple(readings["ja_kun"]),
+        )
+
+    return {"kanji_info": pickle.dumps(_kanji_info)}
+
+
+def gen_kanji_info():
+    return pickle.loads(data_section("kanji_info"))
+
+
+def kanji_info(kanji) -> Optional[KanjiInfo]:
+    return KANJI_INFO.get().get(kanji)
+
+
+def gen_kanjis_by_grade():
+    _kanjis_by_grade = defaultdict(set)
+    for kanji, info in KANJI_INFO.get().items():
+        _kanjis_by_grade[info.grade].add(kanji)
+    return _kanjis_by_grade
+
+
+def kanjis_by_grade():
+    return KANJIS_BY_GRADE.get()
+
+
+class WordTable:
+    """
+    Integer ids of the dictionary words (kanji forms), numbered from the most to the least
+    frequent word, the unranked ones last: sorting word ids sorts the words by frequency.
+    """
+
+    def __init__(self, string_table, positions):
+        self.string_table = string_table  # word -> id
+        self.nb_ranked = positions[0]
+        self.positions = positions[1:]  # id -> position of the word in the string table
+
+    def __len__(self):
+        return len(self.string_table)
+
+    def word_id(self, word):
+        """Id of the word, or -1 if it is not in the dictionary"""
+        return self.string_table.get(word, -1)
+
+    def word(self, word_id):
+        return self.string_table.string(self.positions[word_id])
+
+    def is_ranked(self, word_id):
+        return word_id < self.nb_ranked
+
+
+def build_word_ids():
+    print("Building the word ids")
+    with JMD.jmdict.ctx() as ctx:
+        words = [row[0] for row in ctx.select("SELECT DISTINCT text FROM Kanji")]
+    words.sort(key=lambda word: (word_to_freqrank(word), word))
+    nb_ranked = sum(1 for word in words if word_to_freqrank(word) != sys.maxsize)
+
+    word_ids = stringtable.to_bytes({word: word_id for word_id, word in enumerate(words)})
+
+    # The string table is sorted bytewise
+    positions = array("I", bytes(4 * len(words)))
+    by_bytes = sorted(range(len(words)), key=lambda word_id: words[word_id].encode("utf-8"))
+    for position, word_id in enumerate(by_bytes):
+        positions[word_id] = position
+    return {
+        "word_ids": word_ids,
+        "word_positions": (array("I", [nb_ranked]) + positions).tobytes(),
+    }
+
+
+def gen_word_table():
+    return WordTable(stringtable.StringTable(data_section("word_ids")),
+                     data_section("word_positions").cast("I"))
+
+
+def word_table() -> WordTable:
+    return WORD_TABLE.get()
+
+
+def build_kanji_word_ids():
+    """
+    Build the inverted index from each graded kanji to the ids of the dictionary words
+    containing it, as arrays sorted from the most to the least frequent word.
+    """
+    print("Building the kanji to words index")
+    graded_kanjis = set(chain.from_iterable(kanjis_by_grade().values()))
+    _word_table = word_table()
+
+    _kanji_to_word_ids = defaultdict(list)
+    for word_id in range(len(_word_table)):
+        for kanji in set(_word_table.word(word_id)):
+            if kanji in graded_kanjis:
+                _kanji_to_word_ids[kanji].append(word_id)
+
+    kanjis, word_ids = stringtable.array_table_to_bytes(_kanji_to_word_ids)
+    return {"kanji_words": kanjis, "kanji_word_ids": word_ids}
+
+
+def gen_kanji_to_word_ids():
+    return stringtable.ArrayTable(stringtable.StringTable(data_section("kanji_words")),
+                                  data_section("kanji_word_ids").cast("I"))
+
+
+def kanji_word_ids(kanji):
+    """Ids of the words containing the given kanji, from the most to the least frequent"""
+    return KANJI_TO_WORD_IDS.get().get(kanji, ())
+
+
+def build_kanji_playability():
+    """
+    Build the sets of the kanjis having at least one word, for both settings of
+    MATCH_LAST_KANJI (True: the word must start with the kanji).
+    Only the kanji to match is checked: the other word rules are up to the game.
+    """
+    print("Building the kanji playability table")
+    _word_table = word_table()
+    playability = {False: set(), True: set()}
+    for kanji in KANJI_INFO.get():
+        word_ids = kanji_word_ids(kanji)
+        if word_ids:
+            playability[False].add(kanji)
+        if any(_word_table.word(word_id).startswith(kanji) for word_id in word_ids):
+            playability[True].add(kanji)
+
+    return {"kanji_playability": pickle.dumps(playability)}
+
+
+def gen_kanji_playability():
+    return pickle.loads(data_section("kanji_playability"))
+
+
+def playable_kanjis(match_last_kanji):
+    """Kanjis having at least one word containing them (starting with them if match_last_kanji)"""
+    return KANJI_PLAYABILITY.get()[match_last_kanji]
+
+
+# A kanji form of a JMdict entry, with what the game shows about it
+WordRecord = namedtuple("WordRecord", ["word", "idseq", "kana", "sense"])
+NO_ENTRY = 0xffffffff  # Entry index of the words without entry
+
+
+def gloss_text(lang, gend, text):
+    """Same as str(jamdict.jmdict.SenseGloss)"""
+    tmp = [text]
+    if lang and lang != 'eng':
+        tmp.append(f'(lang:{lang})')
+    if gend:
+        tmp.append(f'(gend:{gend})')
+    return ' '.join(tmp)
+
+
+def build_reading_words():
+    """
+    Build the index from each kana reading to the kanji forms of the entries having that reading,
+    in the same order as JMD.lookup(reading).entries and their kanji_forms
+    """
+    print("Building the reading to words index")
+    with JMD.jmdict.ctx() as ctx:
+        idseq_to_kanas = defaultdict(list)
+        for idseq, text in ctx.select("SELECT idseq, text FROM Kana ORDER BY ID"):
+            idseq_to_kanas[idseq].append(text)
+        idseq_to_words = defaultdict(list)
+        for idseq, text in ctx.select("SELECT idseq, text FROM Kanji ORDER BY ID"):
+            idseq_to_words[idseq].append(text)
+        idseq_to_glosses = defaultdict(list)
+        for idseq, lang, gend, text in ctx.select(
+                "SELECT Sense.idseq, SenseGloss.lang, SenseGloss.gend, SenseGloss.text "
+                "FROM Sense JOIN SenseGloss ON SenseGloss.sid = Sense.ID "
+                "WHERE Sense.ID IN (SELECT MIN(ID) FROM Sense GROUP BY idseq) "
+                "ORDER BY SenseGloss.rowid"):
+            idseq_to_glosses[idseq].append(gloss_text(lang, gend, text))
+
+    # The kana and sense of each entry, (word id, entry index) pairs for each reading,
+    # and the first entry of each word
+    _word_table = word_table()
+    word_entries = array("I", [NO_ENTRY]) * len(_word_table)
+    idseqs = array("I")
+    text_offsets = array("I")
+    texts = bytearray()
+    reading_to_records = defaultdict(list)
+    for idseq in sorted(idseq_to_words.keys()):
+        kanas = idseq_to_kanas[idseq]
+        entry_idx = len(idseqs)
+        idseqs.append(idseq)
+        text_offsets.append(len(texts))
+        texts += (kanas[0] if kanas else "").encode("utf-8")
+        text_offsets.append(len(texts))
+        texts += "/".join(idseq_to_glosses[idseq]).encode("utf-8")
+        records = []
+        for word in idseq_to_words[idseq]:
+            word_id = _word_table.word_id(word)
+            records += [word_id, entry_idx]
+            if word_entries[word_id] == NO_ENTRY:
+                word_entries[word_id] = entry_idx
+        for reading in dict.fromkeys(kanas):
+            reading_to_records[reading] += records
+    text_offsets.append(len(texts))
+
+    readings, reading_records = stringtable.array_table_to_bytes(reading_to_records)
+    return {
+        "readings": readings,
+        "reading_records": reading_records,
+        "entries": (array("I", [len(idseqs)]) + idseqs + text_offsets).tobytes(),
+        "entry_texts": bytes(texts),
+        "word_entries": word_entries.tobytes(),
+    }
+
+
+class ReadingWords(Mapping):
+    """
+    Mapping from each kana reading to the kanji forms (as WordRecord) of the entries having
+    that reading, that can also look up the record of a word: the dictionary is not needed
+    at runtime. Everything stays in the memory-mapped data pack, shared by all the processes
+    using it: the records are only created when they are looked up.
+    """
+
+    def __init__(self, records, entries, texts, word_entries, _word_table):
+        self.records = records  # ArrayTable: reading -> (word id, entry index) pairs, flattened
+        self.word_entries = word_entries  # word id -> index of its first entry, or NO_ENTRY
+        nb_entries = entries[0]
+        self.idseqs = entries[1:nb_entries + 1]
+        # Start of the kana then of the sense of each entry in the texts, then the end
+        self.text_offsets = entries[nb_entries + 1:]
+        self.texts = texts
+        self.word_table = _word_table
+
+    def __getitem__(self, reading):
+        idx = self.records.strings.index(reading)
+        if idx < 0:
+            raise KeyError(reading)
+        items = self.records.items_at(idx)
+        return tuple(self.record(word_id, entry_idx)
+                     for word_id, entry_idx in zip(items[0::2], items[1::2]))
+
+    def __iter__(self):
+        for idx in range(len(self.records)):
+            yield self.records.strings.string(idx)
+
+    def __len__(self):
+        return len(self.records)
+
+    def word_entries_of(self, readings):
+        """
+        For each reading, the (word id, entry index) pairs of the kanji forms having it,
+        flattened and in the order of the records: nothing is decoded
+        """
+        return self.records.get_many(readings)
+
+    def word_record(self, word) -> Optional[WordRecord]:
+        """Record of the word from its first entry, as JMD.lookup(word).entries[0]"""
+        word_id = self.word_table.word_id(word)
+        if word_id < 0 or self.word_entries[word_id] == NO_ENTRY:
+            return None
+        return self.record(word_id, self.word_entries[word_id])
+
+    def record(self, word_id, entry_idx):
+        return WordRecord(self.word_table.word(word_id), self.idseqs[entry_idx],
+                          self.text(2 * entry_idx), self.text(2 * entry_idx + 1))
+
+    def text(self, idx):
+        return self.texts[self.text_offsets[idx]:self.text_offsets[idx + 1]].tobytes() \
+            .decode("utf-8")
+
+
+def gen_reading_to_words():
+    records = stringtable.ArrayTable(stringtable.StringTable(data_section("readings")),
+                                     data_section("reading_records").cast("I"))
+    return ReadingWords(records, data_section("entries").cast("I"), data_section("entry_texts"),
+                        data_section("word_entries").cast("I"), word_table())
+
+
+def reading_words(reading):
+    """Kanji forms (as WordRecord) of the entries having the given kana reading"""
+    return READING_TO_WORDS.get().get(reading, ())
+
+
+def readings_word_entries(readings):
+    """For each reading, (word id, entry index) pairs of its kanji forms, see ReadingWords"""
+    return READING_TO_WORDS.get().word_entries_of(readings)
+
+
+class ReadingIndex:
+    """
+    Prefix trie of the kana readings of the words having graded kanjis, to tell whether a reading
+    being typed can still lead to a word for a given kanji.
+
+    The trie is flattened into sorted arrays: the readings are sorted bytewise in a string table,
+    so the readings under a trie node (starting with a given prefix) are a range of positions.
+    Each kanji has the sorted positions of the readings of its words, for both settings
+    of MATCH_LAST_KANJI (True: only the words starting with the kanji).
+    Everything is memory-mapped, a lookup is a few binary searches.
+    """
+
+    def __init__(self, readings, kanjis, data):
+        self.readings = readings
+        self.kanjis = kanjis  # kanji -> index in the offsets
+        nb_kanjis = data[0]
+        self.offsets = {  # index of a kanji -> start of its positions, the next one is the end
+            False: data[1:nb_kanjis + 2],
+            True: data[nb_kanjis + 2:2 * nb_kanjis + 3],
+        }
+        self.positions = data[2 * nb_kanjis + 3:]
+
+    def kanji_positions(self, kanji, match_last_kanji):
+        idx = self.kanjis.get(kanji)
+        if idx is None:
+            return ()
+        offsets = self.offsets[match_last_kanji]
+        return self.positions[offsets[idx]:offsets[idx + 1]]
+
+    def has_words(self, kanji, prefix, match_last_kanji):
+        """True if a reading starting with the prefix has a word with the kanji"""
+        start, end = self.readings.prefix_range(prefix)
+        positions = self.kanji_positions(kanji, match_last_kanji)
+        idx = bisect_left(positions, start)
+        return idx < len(positions) and positions[idx] < end
+
+
+def build_reading_index():
+    print("Building the reading prefixes index")
+    graded_kanjis = set(chain.from_iterable(kanjis_by_grade().values()))
+    _reading_to_words = READING_TO_WORDS.get()
+
+    readings = sorted(_reading_to_words, key=lambda reading: reading.encode("utf-8"))
+    kanjis = sorted(graded_kanjis, key=lambda kanji: kanji.encode("utf-8"))
+
+    # Positions in the string table, in order
+    kanji_to_positions = {False: defaultdict(list), True: defaultdict(list)}
+    for position, reading in enumerate(readings):
+        words = {record.word for record in _reading_to_words[reading]}
+        for kanji in set(chain.from_iterable(words)) & graded_kanjis:
+            kanji_to_positions[False][kanji].append(position)
+        for kanji in {word[0] for word in words} & graded_kanjis:
+            kanji_to_positions[True][kanji].append(position)
+
+    offsets = array("I")
+    positions = array("I")
+    for match_last_kanji in (False, True):
+        for kanji in kanjis:
+            offsets.append(len(positions))
+            positions.extend(kanji_to_positions[match_last_kanji][kanji])
+        offsets.append(len(positions))
+    return {
+        # The readings string table is the one of the reading to words index
+        "reading_kanjis": stringtable.to_bytes({kanji: idx for idx, kanji in enumerate(kanjis)}),
+        "kanji_reading_positions": (array("I", [len(kanjis)]) + offsets + positions).tobytes(),
+    }
+
+
+def gen_reading_index():
+    return ReadingIndex(stringtable.StringTable(data_section("readings")),
+                        stringtable.StringTable(data_section("reading_kanjis")),
+                        data_section("kanji_reading_positions").cast("I"))
+
+
+def reading_has_words(kanji, prefix, match_last_kanji):
+    """True if a kana reading starting with the prefix has a word with the kanji"""
+    return READING_INDEX.get().has_words(kanji, prefix, match_last_kanji)
+
+
+class EntryCache:
+    """
+    Bounded LRU cache of the dictionary lookups, keyed by ("word", surface form)
+    or ("reading", kana reading), shared by the whole process.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        with self._lock:
+            if key in self.values:
+                self.hits += 1
+                self.values.move_to_end(key)
+                return self.values[key]
+            self.misses += 1
+
+        value = load()
+        self.add(key, value)
+        return value
+
+    def add(self, key, value):
+        with self._lock:
+            self.values[key] = value
+            self.values.move_to_end(key)
+            if len(self.values) > self.max_size:
+                self.values.popitem(last=False)
+                self.evictions += 1
+
+    def stats_text(self):
+        nb_lookups = self.hits + self.misses
+        hit_rate = self.hits / nb_lookups if nb_lookups else 0
+        return (
+            f"Entry cache: {self.hits} hits, {self.misses} misses "
+            f"({hit_rate:.1%} hit rate), {self.evictions} evictions, "
+            f"{len(self.values)}/{self.max_size} entries"
+        )
+
+
+ENTRY_CACHE = EntryCache()
+
+
+def lookup_reading(reading):
+    """
+    Kanji forms (as WordRecord) of the entries having the given kana reading.
+    The records are cached by word as well, for the following lookup_word calls.
+    """
+    def load():
+        records = reading_words(reading)
+        for record in records:
+            ENTRY_CACHE.add(("word", record.word), record)
+        return records
+
+    return ENTRY_CACHE.get(("reading", reading), load)
+
+
+def lookup_word(word) -> WordRecord:
+    """Record of the given kanji form, from the first matching entry of the dictionary"""
+    def load():
+        record = READING_TO_WORDS.get().word_record(word)
+        if record is None:
+            raise Exception(f"No entry found for {word} !")
+        return record
+
+    return ENTRY_CACHE.get(("word", word), load)
+
+
+# In build order: each builder can use the sections built before it
+DATA_PACK_BUILDERS = [
+    build_word_frequency, build_kanji_info, build_word_ids, build_kanji_word_ids,
+    build_kanji_playability, build_reading_words, build_reading_index,
+]
+
+
+def source_fingerprint():
+    """Hash of the paths, sizes and modification times of the files the data is built from"""
+    digest = hashlib.sha256()
+    for filepath in [JMD.db_file, JMD.kd2_file, JMD.jmd_xml_file,
+                     data_filepath(WORDS_FREQ_TXT_FILENAME)]:
+        if filepath and os.path.exists(filepath):
+            stat = os.stat(filepath)
+            digest.update(f"{os.path.abspath(filepath)} {stat.st_size} {stat.st_mtime_ns}\n"
+                          .encode("utf-8"))
+    return digest.digest()
+
+
+def build_data_pack(filepath=None):
+    """Build all the indexes from the dictionary, and write them to the data pack"""
+    filepath = filepath or data_filepath(DATA_PACK_FILENAME)
+    ensure_data_folder()
+    fingerprint = source_fingerprint()
+    pack = datapack.DataPack({}, DATA_VERSION, fingerprint)
+    reset_resources()
+    DATA_PACK.set(pack)
+    try:
+        for build in DATA_PACK_BUILDERS:
+            pack.sections.update(build())
+        datapack.write(filepath, pack.sections, DATA_VERSION, fingerprint)
+    finally:
+        # Loaded again from the file
+        reset_resources()
+    # Only checked here: the next openings rely on the data version and the fingerprint
+    datapack.DataPack.open(filepath, DATA_VERSION, fingerprint, verify=True)
+    print(f"Data pack written to {filepath}")
+
+
+def gen_data_pack():
+    filepath = data_filepath(DATA_PACK_FILENAME)
+    try:
+        return datapack.DataPack.open(filepath, DATA_VERSION, source_fingerprint())
+    except datapack.StaleDataPack as e:
+        print(f"Building the data pack ({e})")
+    build_data_pack(filepath)
+    return datapack.DataPack.open(filepath, DATA_VERSION, source_fingerprint())
+
+
+def data_section(name):
+    return DATA_PACK.get().section(name)
+
+
+DATA_PACK = LazyResource("data pack", gen_data_pack)
+WORD_TO_FREQRANK = LazyResource("word frequencies", gen_word_to_freqrank)
+KANJI_INFO = LazyResource("kanji info", gen_kanji_info)
+KANJIS_BY_GRADE = LazyResource("kanji grades", gen_kanjis_by_grade)
+WORD_TABLE = LazyResource("word ids", gen_word_table)
+KANJI_TO_WORD_IDS = LazyResource("kanji to words index", gen_kanji_to_word_ids)
+KANJI_PLAYABILITY = LazyResource("kanji playability", gen_kanji_playability)
+READING_TO_WORDS = LazyResource("reading to words index", gen_reading_to_words)
+READING_INDEX = LazyResource("reading prefixes index", gen_reading_index)
+
+# Enough to start a game, the other resources are only needed once the player types
+GAME_START_RESOURCES = [
+    DATA_PACK, WORD_TO_FREQRANK, KANJI_INFO, KANJIS_BY_GRADE, WORD_TABLE, KANJI_TO_WORD_IDS,
+    KANJI_PLAYABILITY, READING_TO_WORDS,
+]
+RESOURCES = GAME_START_RESOURCES + [
+    READING_INDEX,
+]
+
+
+def reset_resources():
+    for resource in RESOURCES:
+        resource.reset()
+
+
+def load_resources(on_progress=None):
+    """Load all the resources, reporting (nb loaded, nb resources, next resource name)"""
+    for idx, resource in enumerate(RESOURCES):
+        if on_progress:
+            on_progress(idx, len(RESOURCES), resource.name)
+        resource.get()
+    if on_progress:
+        on_progress(len(RESOURCES), len(RESOURCES), None)
+
+
+class BackgroundLoader(threading.Thread):
+    """
+    Load all the resources in a thread, so that the UI can show up in the meantime.
+    A game can start as soon as game_start_loaded, the loading goes on while it is played.
+    """
+
+    def __init__(self):
+        super().__init__(name="resources-loader", daemon=True)
+        self.progress = (0, len(RESOURCES), None)
+        self.error = None
+
+    def run(self):
+        try:
+            load_resources(self.on_progress)
+        except Exception as e:
+            self.error = e
+
+    @property
+    def game_start_loaded(self):
+        return all(resource.loaded for resource in GAME_START_RESOURCES)
+
+    def on_progress(self, nb_loaded, nb_resources, next_resource_name):
+        self.progress = (nb_loaded, nb_resources, next_resource_name)
@@ -0,0 +1,831 @@
+"""
+Rules of the game, without any user interface: this module must not depend on pygame,
+so that sessions can be simulated or hosted on machines without a display.
+"""
+import random
+import time
+from array import array
+from collections import namedtuple
+from typing import Callable, List, Optional
+
+from .dictionary import kanji_info, kanji_word_ids, kanjis_by_grade, lookup_reading, \
+    lookup_word, playable_kanjis, reading_has_words, readings_word_entries, word_table, \
+    word_to_freqrank
+from .kana_input import LATIN_PATTERN, settled_prefix, to_hiragana
+from .prefetch import Prefetcher
+
+# 1-6 for primary school, 8 for secondary school
+KANJI_GRADE_TO_INFO = {
+    1: {"desc": "教育第１学年", "score": 1},
+    2: {"desc": "教育第２学年", "score": 2},
+    3: {"desc": "教育第３学年", "score": 3},
+    4: {"desc": "教育第４学年", "score": 4},
+    5: {"desc": "教育第５学年", "score": 5},
+    6: {"desc": "教育第６学年", "score": 6},
+    8: {"desc": "常用", "score": 7},
+}
+KANJI_GRADES = sorted(KANJI_GRADE_TO_INFO.keys())
+MAX_KANJI_GRADE = KANJI_GRADES[-1]
+
+# Game config
+JOKER_WORD_POOL_SIZE = 3  # Number of words to consider when picking a random word as a joker
+MATCH_LAST_KANJI = False  # If True, only accept words starting with last kanji of previous word
+ALWAYS_CLEAR_KANJI = False  # If True, even if the player fails to find a word for a kanji,
+                            # it is cleared from the candidates list
+WORDS_MIN_NB_KANJI = 1
+WORDS_MIN_LENGTH = 1
+JOKER_PREFETCH = True  # If True, search the jokers of the possible next kanjis on worker threads
+JOKER_PREFETCH_MAX_WORDS = 4  # Number of words matching the typed reading to prefetch jokers for
+
+CONFS = {
+    "Very Easy": {
+        "TARGET_KANJI_GRADE": 1,
+        "INIT_HP": 50,
+        "MAX_TIMER": 60,
+        "HINT_TIME": 60,
+    },
+    "Easy": {
+        "TARGET_KANJI_GRADE": 3,
+        "INIT_HP": 10,
+        "MAX_TIMER": 30,
+        "HINT_TIME": 15,
+    },
+    "Normal": {
+        "TARGET_KANJI_GRADE": 6,
+        "INIT_HP": 10,
+        "MAX_TIMER": 30,
+        "HINT_TIME": 15,
+    },
+    "Hard": {
+        "TARGET_KANJI_GRADE": 8,
+        "INIT_HP": 10,
+        "MAX_TIMER": 30,
+        "HINT_TIME": 15,
+    },
+    "Expert": {
+        "TARGET_KANJI_GRADE": 8,
+        "INIT_HP": 5,
+        "MAX_TIMER": 30,
+        "HINT_TIME": -1,
+    },
+}
+
+DEFAULT_CONF_NAME = "Easy"
+
+
+# What a new game starts with, precomputed for a warm start (see warm_start.py):
+# first_turns is a list of (kanji to match, joker word, joker word meaning) to pick from
+GameStart = namedtuple("GameStart",
+                       ["valid_kanjis", "playable_kanjis", "candidate_kanjis", "first_turns"])
+
+# Answer of validate_readings for one reading: the valid words it can be played as (from the
+# most to the least frequent) or the reason it can't be played, one of the error codes below
+ReadingValidation = namedtuple("ReadingValidation", ["reading", "valid", "candidates", "error"])
+
+INVALID_INPUT = "invalid_input"  # Not only kana once converted to hiragana
+NO_MATCH = "no_match"  # No word has this reading
+ALREADY_USED = "already_used"  # All the valid words were played before
+# From the most to the least precise, by the digit of the errors of valid_word_candidate
+WORD_ERRORS = {
+    "1": "not_enough_kanjis",  # Less than WORDS_MIN_NB_KANJI valid kanjis
+    "2": "too_short",  # Less than WORDS_MIN_LENGTH characters
+    "3": "no_kanji_to_match",  # Does not contain the kanji to match
+    "4": "wrong_first_kanji",  # Does not start with the kanji to match (MATCH_LAST_KANJI)
+}
+
+
+def choose_most_frequent_word(candidates: List[str]) -> Optional[str]:
+    return candidates[0]
+
+
+class WordIdSet:
+    """Set of word ids, as a bitset over all the dictionary words"""
+
+    def __init__(self, size=0, bits=None):
+        self.bits = bytearray((size + 7) // 8) if bits is None else bits
+
+    def add(self, word_id):
+        self.bits[word_id >> 3] |= 1 << (word_id & 7)
+
+    def __contains__(self, word_id):
+        return bool(self.bits[word_id >> 3] & (1 << (word_id & 7)))
+
+    def copy(self):
+        return WordIdSet(bits=bytearray(self.bits))
+
+
+class WordHistory:
+    """
+    Words played in a session, in order, stored as word ids: an append-only array and a bitset
+    for the membership checks. The dictionary records are only looked up when needed.
+    """
+
+    def __init__(self, nb_words):
+        self.word_ids = array("I")
+        self.used_ids = WordIdSet(nb_words)
+
+    def append(self, word):
+        word_id = word_table().word_id(word)
+        if word_id < 0:
+            raise Exception(f"No word id for {word} !")
+        self.word_ids.append(word_id)
+        self.used_ids.add(word_id)
+
+    def __len__(self):
+        return len(self.word_ids)
+
+    def __contains__(self, word):
+        word_id = word_table().word_id(word)
+        return word_id >= 0 and word_id in self.used_ids
+
+    def __iter__(self):
+        _word_table = word_table()
+        return (_word_table.word(word_id) for word_id in self.word_ids)
+
+    def last_words(self, nb_words):
+        """The nb_words last words, from the oldest to the newest"""
+        _word_table = word_table()
+        return [_word_table.word(word_id) for word_id in self.word_ids[-nb_words:]]
+
+    def last_word(self):
+        return word_table().word(self.word_ids[-1]) if self.word_ids else None
+
+    def rarest_word(self):
+        # Word ids are numbered by frequency
+        return word_table().word(max(self.word_ids)) if self.word_ids else None
+
+
+class GameState:
+    """
+    State and rules of one game session.
+
+    The time comes from the `clock` function (in seconds), so that a simulation can run faster
+    than real time. A user interface can plug into the session with two hooks:
+    - choose_word(candidates): pick one of several valid words (sorted by frequency),
+      or return None to cancel the answer
+    - before_add_word(word, players_choice): called before a word is added,
+      e.g. to show what is happening while the next kanji is prepared
+    joker_prefetch overrides JOKER_PREFETCH, e.g. for a server running many sessions at once.
+    """
+
+    def __init__(self, conf=None,
+                 clock: Callable[[], float] = time.monotonic,
+                 choose_word: Callable[[List[str]], Optional[str]] = choose_most_frequent_word,
+                 before_add_word: Optional[Callable[[str, bool], None]] = None,
+                 verbose=True, start: Optional[GameStart] = None,
+                 joker_prefetch: Optional[bool] = None):
+        # Copied, as reaching a new grade updates the conf
+        self.conf = dict(conf if conf is not None else CONFS[DEFAULT_CONF_NAME])
+        self.clock = clock
+        self.choose_word = choose_word
+        self.before_add_word = before_add_word
+        self.verbose = verbose
+
+        if joker_prefetch is None:
+            joker_prefetch = JOKER_PREFETCH
+        self.joker_prefetcher = Prefetcher(search_joker_words, name="joker prefetch") \
+            if joker_prefetch else None
+        self.typed_input = ""
+        # Can the typed reading still lead to a word with the kanji to match ?
+        self.typed_input_has_words = True
+        self._checked_typed_input = None
+
+        self.free_joker = False
+        self.clear_warning_msg()
+
+        self.hp = self.conf["INIT_HP"]
+        self.combo = 0
+        self.best_combo = 0  # Longest chain of words found without a mistake
+        self.score = 0
+        self.last_score_update = 0
+        self.last_1up_score = 10
+
+        self.running = True
+
+        self.timer = self.conf["MAX_TIMER"]
+
+        if start is None:
+            self.init_candidate_kanjis()
+        else:
+            self.valid_kanjis = start.valid_kanjis
+            self.playable_kanjis = start.playable_kanjis
+            self.candidate_kanjis = set(start.candidate_kanjis)
+            self.init_nb_candidate_kanjis = len(self.candidate_kanjis)
+
+        self.words = WordHistory(len(word_table()))
+
+        if start is not None and start.first_turns:
+            self.kanji_to_match, self.joker_word, self.joker_word_sense = \
+                random.choice(start.first_turns)
+            self.log(f"Joker is {self.joker_word} ({self.joker_word_sense})")
+        else:
+            kanjis = list(self.candidate_kanjis)
+            self.kanji_to_match = random.choice(kanjis)
+            self.update_joker_word()
+        self.prefetch_jokers(self.joker_word, players_choice=False)
+
+        self.last_update_ts = self.clock()
+
+    def log(self, msg):
+        if self.verbose:
+            print(msg)
+
+    def process(self, validated_input=None, typed_input="") -> bool:
+        """
+        Play one step of the game: validated_input is the romaji (or kana) answer of the player
+        if they pressed Enter, typed_input the answer they are currently typing.
+        Return True if a new word was added.
+        """
+        if not self.running:
+            return False
+
+        nb_words = len(self.words)
+
+        # Remove the msg as soon as user started to type
+        if typed_input:
+            self.clear_warning_msg()
+
+        if typed_input != self.typed_input:
+            self.typed_input = typed_input
+            self.prefetch_typed_words(typed_input)
+
+        # Time up ?
+        if self.timer == 0:
+            self.set_warning_msg("Ran out of time ! Here is a word")
+            self.lose_hp()
+            self.notify_before_add_word(self.joker_word, players_choice=False)
+            self.add_word(self.joker_word, players_choice=False)
+
+        # Pressed Enter with an empty form ? Unstuck the player
+        elif validated_input == "":
+            if self.hp == 1 and not self.free_joker:
+                self.set_warning_msg("Can't have a joker with only 心 left !")
+            elif not self.joker_word:
+                self.set_warning_msg("Sorry, no suggestion...")
+            else:
+                self.set_warning_msg("Giving up ? here is a word")
+                if not self.free_joker:
+                    self.lose_hp()
+
+                self.notify_before_add_word(self.joker_word, players_choice=False)
+                self.add_word(self.joker_word, players_choice=False)
+                self.free_joker = False
+
+        # User validated a word proposal ?
+        elif validated_input:
+            self.process_validated_user_input(validated_input)
+
+        self.update_typed_input_has_words()
+        self.update_timer()
+
+        return len(self.words) > nb_words
+
+    def update_typed_input_has_words(self):
+        checked = (self.kanji_to_match, self.typed_input)
+        if checked == self._checked_typed_input:
+            return
+        self._checked_typed_input = checked
+        self.typed_input_has_words = reading_has_words(
+            self.kanji_to_match, settled_prefix(self.typed_input), MATCH_LAST_KANJI)
+
+    def update_timer(self):
+        now = self.clock()
+        self.timer -= now - self.last_update_ts
+        self.last_update_ts = now
+        if self.timer < 0:
+            self.timer = 0
+
+    def notify_before_add_word(self, word, players_choice):
+        if self.before_add_word is not None:
+            self.before_add_word(word, players_choice)
+
+    def process_validated_user_input(self, validated_input):
+        higana_input = to_hiragana(validated_input)
+        # Check there is only hiragana
+        if LATIN_PATTERN.search(higana_input):
+            self.set_warning_msg("Invalid input !")
+            return
+
+        valid_entries_by_kanji_form, errors = self.lookup_word_entries(higana_input)
+
+        if not valid_entries_by_kanji_form:
+            if errors:
+                # error message have a digit at the beginning, to get the most precise error
+                error = sorted(errors)[0][1:]
+                self.set_warning_msg(error)
+            else:
+                self.set_warning_msg("No match ! press Enter again to give up")
+            self.lose_hp()
+            self.free_joker = True
+            return
+
+        self.log(f"Found {len(valid_entries_by_kanji_form.keys())} valid entries "
+                 f"for {higana_input}")
+        for word in list(valid_entries_by_kanji_form.keys()):
+            if word in self.words:
+                self.log(f"Excluding word {word}: already used before")
+                del valid_entries_by_kanji_form[word]
+
+        if not valid_entries_by_kanji_form:
+            self.set_warning_msg("Already used, try something else")
+            return
+
+        candidates = sorted(valid_entries_by_kanji_form.keys(), key=word_to_freqrank)
+
+        if len(candidates) > 1:
+            for word in candidates:
+                self.prefetch_jokers(word, players_choice=True)
+            new_word = self.choose_word(candidates)
+            if new_word is None:
+                return
+        else:
+            new_word = candidates[0]
+
+        # Lose the free joker if any
+        self.free_joker = False
+
+        self.notify_before_add_word(new_word, players_choice=True)
+        self.add_word(new_word)
+
+    def lookup_word_entries(self, higana_input):
+        valid_entries_by_kanji_form = {}
+        errors = []
+
+        self.log(f"Lookup result for {higana_input}:")
+        valid_idseq = None
+        for record in lookup_reading(higana_input):
+            if record.idseq == valid_idseq:
+                # Already found a valid kanji form for this entry
+                continue
+            word = record.word
+            is_valid, error = self.valid_word_candidate(word)
+            if is_valid:
+                valid_entries_by_kanji_form[word] = record
+                valid_idseq = record.idseq
+                self.log(f"- {word}: OK")
+            else:
+                self.log(f"- {word}: {error}")
+                errors.append(error)
+
+        return valid_entries_by_kanji_form, errors
+
+    def add_word(self, new_word, players_choice=True):
+        previous_kanji = self.kanji_to_match
+
+        # Remove the kanji to match from the list of kanjis to "collect"
+        if (
+                self.kanji_to_match in self.candidate_kanjis
+                and (players_choice or ALWAYS_CLEAR_KANJI)
+        ):
+            self.clear_kanji_to_match()
+
+        # Lookup the new word and add it to the history
+        record = lookup_word(new_word)
+        self.log(f"Added word {new_word}　({record.sense}) "
+                 f"freqrank: {word_to_freqrank(new_word)}")
+        self.words.append(new_word)
+
+        last_word = new_word
+        if MATCH_LAST_KANJI:
+            self.kanji_to_match = last_word[-1]
+        else:
+            candidates = {kanji for kanji in last_word if
+                          (kanji in self.candidate_kanjis and kanji != previous_kanji)}
+            # If there are no kanjis for our level, pick a random kanji in the pool
+            if not candidates:
+                candidates = self.candidate_kanjis
+            self.kanji_to_match = random.choice(list(candidates))
+
+        has_possible_words = self.update_joker_word()
+        if not has_possible_words:
+            self.set_warning_msg(f"No words starting with {self.kanji_to_match}, here is a new one")
+            self.pick_new_kanji_and_joker_word()
+
+        # New turn: what was prefetched for the other possible next kanjis is stale
+        if self.joker_prefetcher:
+            self.joker_prefetcher.clear()
+        self.prefetch_jokers(self.joker_word, players_choice=False)
+
+        self.update_score(players_choice, new_word, previous_kanji)
+
+        # Reset the timer ! (not counting the time spent choosing the word)
+        self.timer = self.conf["MAX_TIMER"]
+        self.last_update_ts = self.clock()
+
+    def clear_kanji_to_match(self):
+        self.candidate_kanjis.remove(self.kanji_to_match)
+        # Did we clear all the kanjis up to selected grade ?
+        if not self.candidate_kanjis:
+            # Increase the grade
+            _kanjis_by_grade = kanjis_by_grade()
+
+            self.conf['TARGET_KANJI_GRADE'] = next_grade(self.conf['TARGET_KANJI_GRADE'])
+
+            if self.conf['TARGET_KANJI_GRADE'] < MAX_KANJI_GRADE:
+                new_kanjis = _kanjis_by_grade[self.conf['TARGET_KANJI_GRADE']]
+                self.candidate_kanjis.update(new_kanjis & self.playable_kanjis)
+                self.init_nb_candidate_kanjis += len(self.candidate_kanjis)
+            else:
+                # Restart from beginning: all the kanjis must be cleared again
+                self.conf['TARGET_KANJI_GRADE'] = MAX_KANJI_GRADE
+                self.candidate_kanjis.update(self.playable_kanjis)
+
+    def update_score(self, players_choice, new_word, previous_kanji):
+        if not players_choice:
+            self.last_score_update = 0
+            return
+
+        score_update = self.compute_score_update(new_word, previous_kanji)
+        self.score += score_update
+        self.last_score_update = score_update
+        msg = f"正解！　+{score_update}点"
+
+        bonus_hp = 0
+        while self.score > self.last_1up_score:
+            bonus_hp += 1
+            self.last_1up_score *= 2
+
+        if bonus_hp:
+            self.hp += bonus_hp
+            msg = f"{msg}, +{bonus_hp}心 (次:{self.last_1up_score * 2}点)"
+
+        self.set_warning_msg(msg, is_error=False)
+
+    def update_joker_word(self) -> bool:
+        self.joker_word = self.find_one_valid_word()
+
+        # No word matching at all ?
+        if not self.joker_word:
+            return False
+
+        self.joker_word_sense = get_word_meaning(self.joker_word)
+        self.log(f"Joker is {self.joker_word} ({self.joker_word_sense})")
+        return True
+
+    def compute_score_update(self, new_word, previous_kanji):
+        self.combo += 1
+        self.best_combo = max(self.best_combo, self.combo)
+        grade_scores = self.compute_word_grade_scores(new_word, previous_kanji)
+        total_grade_score = sum(grade_scores)
+        no_hint_multiplier = 2 if (self.timer > self.conf["HINT_TIME"]) else 1
+        score_update = total_grade_score * no_hint_multiplier * self.combo
+        self.log(
+            f"Score += ({'+'.join(map(str, grade_scores))}★) "
+            f"ｘ ({self.combo}◎) x ({no_hint_multiplier} タイマ)")
+        return score_update
+
+    def compute_word_grade_scores(self, word, previous_kanji):
+        scores = []
+        for char in word:
+            # Only reward for the "new" kanjis
+            if (
+                    char == previous_kanji or
+                    (char in self.valid_kanjis and char not in self.candidate_kanjis)
+            ):
+                grade = kanji_info(char).grade
+                scores.append(KANJI_GRADE_TO_INFO[grade]['score'])
+        return scores
+
+    def clear_warning_msg(self):
+        self.warning_msg = None
+        self.warning_msg_start_ts = None
+
+    def set_warning_msg(self, new_msg, is_error=True):
+        self.warning_msg = new_msg
+        self.warning_msg_start_ts = self.clock()
+        self.warning_msg_is_error = is_error
+
+    def warning_msg_age(self):
+        """Seconds since the warning message was set"""
+        return self.clock() - self.warning_msg_start_ts
+
+    def kanjis_counter_text(self):
+        grade_score = KANJI_GRADE_TO_INFO[self.conf['TARGET_KANJI_GRADE']]['score']
+        return (
+            f"{grade_score * '★'}漢字 "
+            f"{len(self.candidate_kanjis)}／{self.init_nb_candidate_kanjis}"
+        )
+
+    def dump_words(self, filepath="log"):
+        if not self.words:
+            return
+
+        with open(filepath, "w") as outfile:
+            print(f"Score: {self.score}", file=outfile)
+            print(self.kanjis_counter_text(), file=outfile)
+            rarest_record = lookup_word(self.words.rarest_word())
+            print(f"Rarest word: {rarest_record.word} {rarest_record.kana} {rarest_record.sense}",
+                  file=outfile)
+
+            print("Words list:", file=outfile)
+            for word in self.words:
+                record = lookup_word(word)
+                print(f"- {word} {record.kana} {record.sense}", file=outfile)
+
+    def init_candidate_kanjis(self):
+        self.valid_kanjis, self.playable_kanjis, self.candidate_kanjis = \
+            candidate_kanjis_sets(self.conf['TARGET_KANJI_GRADE'])
+        self.init_nb_candidate_kanjis = len(self.candidate_kanjis)
+
+    def pick_new_kanji_and_joker_word(self):
+        # Candidate kanjis all have words: only retried once all the words of a kanji were used
+        kanjis = list(self.candidate_kanjis)
+        while True:
+            self.kanji_to_match = random.choice(kanjis)
+            has_possible_words = self.update_joker_word()
+            if has_possible_words:
+                return
+            # Could not find any valid word with that kanji, will try another
+            self.log(f"Could not find a word starting with {self.kanji_to_match} !")
+            kanjis.remove(self.kanji_to_match)
+
+    def prefetch_jokers(self, word, players_choice):
+        """Search ahead of time the joker words of the kanjis that could follow the given word"""
+        if not self.joker_prefetcher or not word:
+            return
+
+        # Candidate kanjis once the word is added
+        candidate_kanjis = self.candidate_kanjis
+        if players_choice or ALWAYS_CLEAR_KANJI:
+            candidate_kanjis = candidate_kanjis - {self.kanji_to_match}
+            if not candidate_kanjis:
+                # Going to the next grade, unlikely enough not to bother
+                return
+        candidate_kanjis = frozenset(candidate_kanjis)
+
+        # Used words once the word is added
+        used_word_ids = self.words.used_ids.copy()
+        word_id = word_table().word_id(word)
+        if word_id >= 0:
+            used_word_ids.add(word_id)
+
+        if MATCH_LAST_KANJI:
+            next_kanjis = {word[-1]}
+        else:
+            next_kanjis = {kanji for kanji in word
+                           if kanji in candidate_kanjis and kanji != self.kanji_to_match}
+        for kanji in next_kanjis:
+            key = self.joker_search_key(kanji, len(self.words) + 1, word, len(candidate_kanjis))
+            self.joker_prefetcher.prefetch(key, kanji, self.valid_kanjis, candidate_kanjis,
+                                           used_word_ids)
+
+    def prefetch_typed_words(self, typed_input):
+        """Prefetch the jokers following the words the player is typing"""
+        if not self.joker_prefetcher or not typed_input:
+            return
+
+        higana_input = to_hiragana(typed_input)
+        # Still typing a syllable ?
+        if LATIN_PATTERN.search(higana_input):
+            return
+
+        words = [record.word for record in lookup_reading(higana_input)
+                 if record.word not in self.words and self.valid_word_candidate(record.word)[0]]
+        words = sorted(set(words), key=word_to_freqrank)
+        for word in words[:JOKER_PREFETCH_MAX_WORDS]:
+            self.prefetch_jokers(word, players_choice=True)
+
+    def joker_search_key(self, kanji, nb_words, last_word, nb_candidate_kanjis):
+        """
+        Identify the state a joker search is made for. Within a turn, the history is append-only
+        and the candidate kanjis can only lose the kanji to match (or change grade), so their
+        sizes and the last word are enough. The prefetcher is cleared at each turn.
+        """
+        return kanji, nb_words, last_word, nb_candidate_kanjis, self.conf['TARGET_KANJI_GRADE']
+
+    def find_joker_words(self):
+        """Words to pick the joker from, see search_joker_words"""
+        joker_words = None
+        if self.joker_prefetcher and self.words:
+            key = self.joker_search_key(self.kanji_to_match, len(self.words),
+                                        self.words.last_word(), len(self.candidate_kanjis))
+            joker_words = self.joker_prefetcher.get(key)
+        if joker_words is None:
+            joker_words = search_joker_words(self.kanji_to_match, self.valid_kanjis,
+                                             self.candidate_kanjis, self.words.used_ids)
+        return joker_words
+
+    def find_one_valid_word(self):
+        words, candidate_kanjis_only = self.find_joker_words()
+        if not words:
+            return None
+
+        if not candidate_kanjis_only:
+            self.log("No word with a candidate kanjis, took any word with the kanji to match")
+        self.log(f"Possible words for {self.kanji_to_match}:")
+        for word in words[:10]:
+            self.log(f"- {word} ({word_to_freqrank(word)})")
+        # Randomize a bit
+        return random.choice(words)
+
+    def close(self):
+        if self.joker_prefetcher:
+            self.joker_prefetcher.shutdown()
+
+    def lose_hp(self):
+        self.hp -= 1
+        self.combo = 0
+        # Game over ?
+        if self.hp == 0:
+            self.running = False
+
+    def valid_word_candidate(self, word):
+        return valid_word_candidate(word, self.kanji_to_match, self.valid_kanjis)
+
+    def validate_readings(self, readings):
+        """Validate many answers to the kanji to match at once, see validate_readings"""
+        return validate_readings(self.kanji_to_match, readings, self.valid_kanjis,
+                                 self.words.used_ids)
+
+    def get_word_kanjis(self, word):
+        return get_word_kanjis(word, self.valid_kanjis)
+
+
+def candidate_kanjis_sets(target_kanji_grade):
+    """(valid kanjis, playable kanjis, candidate kanjis up to the target grade) of a new game"""
+    _kanjis_by_grade = kanjis_by_grade()
+    kanjis_with_words = playable_kanjis(MATCH_LAST_KANJI)
+
+    valid = set().union(*(_kanjis_by_grade[grade] for grade in KANJI_GRADES))
+    if WORDS_MIN_LENGTH > 1 or WORDS_MIN_NB_KANJI > 1:
+        # The data pack only checks the kanji to match: check the other word rules here
+        _word_table = word_table()
+        kanjis_with_words = {
+            kanji for kanji in kanjis_with_words
+            if any(valid_word_candidate(_word_table.word(word_id), kanji, valid)[0]
+                   for word_id in kanji_word_ids(kanji))
+        }
+
+    playable = set()
+    candidates = set()
+    for grade in KANJI_GRADES:
+        # Kanjis without any word could never be cleared: leave them out from the start
+        kanjis = {kanji for kanji in _kanjis_by_grade[grade] if kanji in kanjis_with_words}
+        playable.update(kanjis)
+        if grade <= target_kanji_grade:
+            candidates.update(kanjis)
+    return valid, playable, candidates
+
+
+def compute_game_start(conf, nb_first_turns) -> GameStart:
+    """Candidate kanjis of a new game, and a few random first kanjis with their joker word"""
+    valid_kanjis, playable, candidate_kanjis = candidate_kanjis_sets(conf['TARGET_KANJI_GRADE'])
+    no_used_word_ids = WordIdSet(len(word_table()))
+    first_turns = []
+    kanjis = random.sample(sorted(candidate_kanjis), min(nb_first_turns, len(candidate_kanjis)))
+    for kanji in kanjis:
+        words, _ = search_joker_words(kanji, valid_kanjis, candidate_kanjis, no_used_word_ids)
+        if words:
+            joker_word = random.choice(words)
+            first_turns.append((kanji, joker_word, get_word_meaning(joker_word)))
+    return GameStart(valid_kanjis, playable, candidate_kanjis, first_turns)
+
+
+def valid_word_candidate(word, kanji_to_match, valid_kanjis):
+    if MATCH_LAST_KANJI and not word.startswith(kanji_to_match):
+        return False, f'4 Word must start with {kanji_to_match}'
+    if kanji_to_match not in word:
+        return False, f'3 Word must contain {kanji_to_match}'
+    if len(word) < WORDS_MIN_LENGTH:
+        return False, f'2 Word must be {WORDS_MIN_LENGTH}+ character'
+
+    kanjis = get_word_kanjis(word, valid_kanjis)
+
+    if len(kanjis) < WORDS_MIN_NB_KANJI:
+        return False, f'1 Word must contain {WORDS_MIN_NB_KANJI}+ kanji'
+
+    return True, None
+
+
+def validate_readings(kanji_to_match, readings, valid_kanjis, used_word_ids=None) \
+        -> List[ReadingValidation]:
+    """
+    Validate readings (romaji or hiragana) as answers to the given kanji, as
+    GameState.process_validated_user_input would, without playing them.
+    Meant for many readings at once (bots, replays...): the readings are looked up in one pass
+    over the index, their records are not decoded, the words are only checked once, by word id,
+    and words without the kanji to match are told apart with its index.
+    Used words (if given, a WordIdSet) are not valid anymore.
+    """
+    _word_table = word_table()
+    kanji_ids = set(kanji_word_ids(kanji_to_match))
+    no_kanji_error = "4" if MATCH_LAST_KANJI else "3"
+    word_errors = {}  # word id -> digit of its error (see WORD_ERRORS), None if valid
+
+    def word_error(word_id):
+        if word_id not in kanji_ids:
+            return no_kanji_error
+        if word_id not in word_errors:
+            _, error = valid_word_candidate(_word_table.word(word_id), kanji_to_match,
+                                            valid_kanjis)
+            word_errors[word_id] = error[0] if error else None
+        return word_errors[word_id]
+
+    higana_inputs = [to_hiragana(reading) for reading in readings]
+    validations = []
+    for reading, higana_input, word_entries in zip(readings, higana_inputs,
+                                                   readings_word_entries(higana_inputs)):
+        if LATIN_PATTERN.search(higana_input):
+            validations.append(ReadingValidation(reading, False, [], INVALID_INPUT))
+            continue
+
+        # Same as lookup_word_entries: the first valid kanji form of each entry
+        word_ids = {}
+        errors = []
+        valid_entry_idx = None
+        for word_id, entry_idx in zip(word_entries[0::2], word_entries[1::2]):
+            if entry_idx == valid_entry_idx:
+                continue
+            error = word_error(word_id)
+            if error is None:
+                word_ids[word_id] = None
+                valid_entry_idx = entry_idx
+            else:
+                errors.append(error)
+
+        if not word_ids:
+            # The most precise error, as shown to the player
+            error = WORD_ERRORS[min(errors)] if errors else NO_MATCH
+            validations.append(ReadingValidation(reading, False, [], error))
+            continue
+        if used_word_ids is not None:
+            word_ids = [word_id for word_id in word_ids if word_id not in used_word_ids]
+            if not word_ids:
+                validations.append(ReadingValidation(reading, False, [], ALREADY_USED))
+                continue
+
+        candidates = sorted((_word_table.word(word_id) for word_id in word_ids),
+                            key=word_to_freqrank)
+        validations.append(ReadingValidation(reading, True, candidates, None))
+    return validations
+
+
+def get_word_kanjis(word, valid_kanjis):
+    kanjis = []
+    for char in word:
+        if char in valid_kanjis:
+            kanjis.append(char)
+    return kanjis
+
+
+def search_joker_words(kanji_to_match, valid_kanjis, candidate_kanjis, used_word_ids):
+    """
+    Words to pick the joker from: the JOKER_WORD_POOL_SIZE most frequent valid and not used yet
+    words containing kanji_to_match, or all of them if none has a frequency rank.
+    Words made of candidate kanjis only are preferred: returns (words, candidate_kanjis_only).
+
+    As word ids are sorted by frequency, the search stops at the first few matching ids.
+    Only reads its arguments, so that it can run on a worker thread.
+    """
+    _word_table = word_table()
+    candidate_kanjis_words = []
+    any_words = []
+    candidate_kanjis_ranked = False
+    any_ranked = False
+    for word_id in kanji_word_ids(kanji_to_match):
+        ranked = _word_table.is_ranked(word_id)
+        if not ranked and candidate_kanjis_ranked:
+            # Only unranked words left, the ranked ones are preferred
+            break
+        if word_id in used_word_ids:
+            continue
+        word = _word_table.word(word_id)
+        is_valid, _ = valid_word_candidate(word, kanji_to_match, valid_kanjis)
+        if not is_valid:
+            continue
+
+        if not ranked or len(any_words) < JOKER_WORD_POOL_SIZE:
+            if ranked or not any_ranked:
+                any_words.append(word)
+                any_ranked = ranked
+        # Avoid kanjis that are not outside our grade
+        if not any((
+                kanji in valid_kanjis and kanji not in candidate_kanjis
+                for kanji in word
+        )):
+            candidate_kanjis_words.append(word)
+            candidate_kanjis_ranked = ranked
+            if ranked and len(candidate_kanjis_words) == JOKER_WORD_POOL_SIZE:
+                break
+
+    if candidate_kanjis_words:
+        return candidate_kanjis_words, True
+    return any_words, False
+
+
+def get_word_meaning(word):
+    return lookup_word(word).sense
+
+
+def kanji_meaning_and_grade(kanji):
+    info = kanji_info(kanji)
+    if info is None:
+        return "", None
+    return info.meaning, info.grade
+
+
+def next_grade(grade):
+    idx = KANJI_GRADES.index(grade)
+    if idx == len(KANJI_GRADES) - 1:
+        return idx
+    return idx + 1
@@ -1,57 +1,20 @@
-import operator
-import os
-import pickle
-import random
+import math
 import re
 import sys
+import threading
 import time
-from collections import OrderedDict, defaultdict
 from itertools import chain
 from typing import List, Optional
 
 import pygame
-import romkan
-from jamdict import Jamdict
 
-JMD = Jamdict()
-
-if not os.path.exists('data'):
-    os.mkdir('data')
-
-WORDS_FREQ_FILEPATH = "data/nf_words_freq"
-
-
-def generate_word_frequency_file(filepath):
-    nf_to_kanjis = defaultdict(set)
-    for entry in JMD.jmdict_xml.entries:
-        for word in chain(entry.kanji_forms, entry.kana_forms):
-            for pri in word.pri:
-                if pri.startswith('nf'):
-                    nf_x = int(pri[-2:])
-                    nf_to_kanjis[nf_x].add(word.text)
-
-    with open(filepath, "w") as outfile:
-        for nf_x in sorted(nf_to_kanjis.keys()):
-            for word in nf_to_kanjis[nf_x]:
-                print(word, file=outfile)
-
-
-def gen_word_to_freqrank():
-    _word_to_freqrank = {}
-    if not os.path.exists(WORDS_FREQ_FILEPATH):
-        generate_word_frequency_file(WORDS_FREQ_FILEPATH)
-    with open(WORDS_FREQ_FILEPATH) as infile:
-        for idx, line in enumerate(infile):
-            word = line.rstrip()
-            _word_to_freqrank[word] = idx
-    return _word_to_freqrank
-
-
-WORD_TO_FREQRANK = gen_word_to_freqrank()
-
-
-def word_to_freqrank(word):
-    return WORD_TO_FREQRANK.get(word, sys.maxsize)
+from . import engine, warm_start
+from .dictionary import ENTRY_CACHE, GAME_START_RESOURCES, BackgroundLoader, lookup_word
+from .engine import CONFS, DEFAULT_CONF_NAME, KANJI_GRADE_TO_INFO, GameState, \
+    kanji_meaning_and_grade
+from .kana_input import KanaInput
+from .profiler import PROFILE_FILEPATH, Profiler, StartupTimer
+from .surface_cache import TextSurfaceCache
 
 
 BLUE = (40, 120, 230)
@@ -62,59 +25,13 @@ WHITE = (255, 255, 255)
 YELLOW = (255, 255, 0)
 GRAY = (128, 128, 128)
 
-# 1-6 for primary school, 8 for secondary school
-KANJI_GRADE_TO_INFO = {
-    1: {"desc": "教育第１学年", "score": 1},
-    2: {"desc": "教育第２学年", "score": 2},
-    3: {"desc": "教育第３学年", "score": 3},
-    4: {"desc": "教育第４学年", "score": 4},
-    5: {"desc": "教育第５学年", "score": 5},
-    6: {"desc": "教育第６学年", "score": 6},
-    8: {"desc": "常用", "score": 7},
-}
-KANJI_GRADES = sorted(KANJI_GRADE_TO_INFO.keys())
-MAX_KANJI_GRADE = KANJI_GRADES[-1]
-
-# Game config
-JOKER_WORD_POOL_SIZE = 3  # Number of words to consider when picking a random word as a joker
-MATCH_LAST_KANJI = False  # If True, only accept words starting with last kanji of previous word
-ALWAYS_CLEAR_KANJI = False  # If True, even if the player fails to find a word for a kanji,
-                            # it is cleared from the candidates list
-WORDS_MIN_NB_KANJI = 1
-WORDS_MIN_LENGTH = 1
-
-CONFS = {
-    "Very Easy": {
-        "TARGET_KANJI_GRADE": 1,
-        "INIT_HP": 50,
-        "MAX_TIMER": 60,
-        "HINT_TIME": 60,
-    },
-    "Easy": {
-        "TARGET_KANJI_GRADE": 3,
-        "INIT_HP": 10,
-        "MAX_TIMER": 30,
-        "HINT_TIME": 15,
-    },
-    "Normal": {
-        "TARGET_KANJI_GRADE": 6,
-        "INIT_HP": 10,
-        "MAX_TIMER": 30,
-        "HINT_TIME": 15,
-    },
-    "Hard": {
-        "TARGET_KANJI_GRADE": 8,
-        "INIT_HP": 10,
-        "MAX_TIMER": 30,
-        "HINT_TIME": 15,
-    },
-    "Expert": {
-        "TARGET_KANJI_GRADE": 8,
-        "INIT_HP": 5,
-        "MAX_TIMER": 30,
-        "HINT_TIME": -1,
-    },
-}
+DIRTY_RECTS_RENDERING = True  # If True, only redraw the parts of the screen that changed
+MAX_FPS = 30  # Frame rate cap
+EVENT_DRIVEN_LOOP = True  # If True, sleep until an input or a timer event when nothing animates
+WAKE_UP_EVENT = pygame.USEREVENT + 1  # Timer event ending the wait for the next frame
+
+WARNING_MSG_FADE_START = 1  # Seconds before the warning message starts to fade
+WARNING_MSG_FADE_TIME = 1
 
 CONF_KEY_TO_TEXT = {
     "INIT_HP": "Number of lives (心)",
@@ -123,13 +40,28 @@ CONF_KEY_TO_TEXT = {
     "TARGET_KANJI_GRADE": "Target 常用漢字 grade",
 }
 
-DEFAULT_CONF_NAME = "Easy"
-CONF = CONFS[DEFAULT_CONF_NAME]
-CONF_KEYS = list(CONF.keys())
+CONF_KEYS = list(CONFS[DEFAULT_CONF_NAME].keys())
+
+# Timed with --profile
+PROFILED_GAME_METHODS = ["handle_events", "process", "render", "render_dirty_rects",
+                         "render_before_add_word"]
+IDLE_GAME_METHODS = ["get_events", "choose_word", "limit_frame_rate"]  # Waiting
+PROFILED_STATE_METHODS = ["process_validated_user_input", "add_word", "find_one_valid_word"]
+# Dictionary lookups, timed in the module calling them
+PROFILED_ENGINE_LOOKUPS = ["lookup_reading", "lookup_word", "reading_has_words"]
+PROFILED_GAME_LOOKUPS = ["lookup_word"]
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, profiler: Optional[Profiler] = None, profile_overlay=False,
+                 startup: Optional[StartupTimer] = None):
+        # Reported once the first frame of the game is rendered, with --profile
+        self.startup = startup or StartupTimer()
+
+        # Load the dictionary while the screen opens and the player is choosing the difficulty
+        self.loader = BackgroundLoader()
+        self.loader.start()
+
         pygame.init()
         pygame.font.init()
         pygame.display.init()
@@ -141,64 +73,152 @@ class Game:
         self.screen_h = int(screen_ratio * pygame.display.Info().current_h)
         self.screen = pygame.display.set_mode((self.screen_w, self.screen_h), pygame.RESIZABLE)
         pygame.display.set_caption("Kanji game - Press ESC to quit")
+        self.startup.end_phase("display")
 
-        font_family = get_font_family()
-        self.small_font = pygame.font.SysFont(font_family, 24)
-        self.font = pygame.font.SysFont(font_family, 48)
-        self.large_font = pygame.font.SysFont(font_family, 80)
+        # Written by the previous launch, see write_warm_start_snapshot
+        self.snapshot = warm_start.load_snapshot()
+        self.font_path = warm_start.snapshot_font_path(self.snapshot) or get_font_path()
+        self.small_font = pygame.font.Font(self.font_path, 24)
+        self.font = pygame.font.Font(self.font_path, 48)
+        self.large_font = pygame.font.Font(self.font_path, 80)
+        self.text_cache = TextSurfaceCache()
+        self.startup.end_phase("fonts")
 
         self.clock = pygame.time.Clock()
 
-        self.options_screen()
+        # Each element of the game screen, in drawing order
+        self.render_elements = [
+            self.render_top_pane,
+            self.render_words,
+            self.render_hint,
+            self.render_prompt,
+            self.render_kanjis_counter,
+            self.render_combo_jauge,
+            self.render_warning_msg,
+        ]
+        if profile_overlay:
+            self.render_elements.append(self.render_profile_overlay)
+        self.recorded_blits = None
+        self.previous_elements_blits = None
+        self.full_redraw = True
+
+        conf_name = self.options_screen()
 
         self.loading_screen()
+        self.startup.end_phase("loading the dictionary")
 
-        self.user_input_value = ""
-        self.free_joker = False
-        self.clear_warning_msg()
-
-        self.hp = CONF["INIT_HP"]
-        self.combo = 0
-        self.score = 0
-        self.last_score_update = 0
-        self.last_1up_score = 10
-
+        self.kana_input = KanaInput()
+        self.choosing_word = False
         self.running = True
 
-        self.timer = CONF["MAX_TIMER"]
-
-        self.init_candidate_kanjis()
-
-        self.words = OrderedDict()
-
-        kanjis = list(self.candidate_kanjis)
-        self.kanji_to_match = random.choice(kanjis)
-        self.update_joker_word()
-
-        # DEBUG
-        # self.kanji_to_match = "灰"
-        # self.update_joker_word()
-
-        # DEBUG
-        # self.kanji_to_match = "小"
-        # self.update_joker_word()
+        self.profiler = profiler
+        if self.profiler:
+            self.profiler.startup = self.startup
+            self.instrument_methods()
+
+        # The rules of the game: this class only renders its state and forwards the inputs
+        game_start = warm_start.snapshot_game_start(self.snapshot, conf_name)
+        self.state = GameState(CONFS[conf_name], choose_word=self.choose_word,
+                               before_add_word=self.render_before_add_word, start=game_start)
+        self.startup.end_phase("game state" if game_start is None
+                               else "game state (from the warm start snapshot)")
+        threading.Thread(target=self.write_warm_start_snapshot, name="warm-start-snapshot",
+                         daemon=True).start()
+
+        if self.profiler:
+            self.profiler.instrument(self.state, PROFILED_STATE_METHODS)
+
+    def instrument_methods(self):
+        """Time the phases of a frame with the profiler"""
+        self.profiler.instrument(self, PROFILED_GAME_METHODS)
+        self.profiler.instrument(self, IDLE_GAME_METHODS, idle=True)
+        self.render_elements = [self.profiler.wrap(render_element)
+                                for render_element in self.render_elements]
+        self.profiler.instrument(engine, PROFILED_ENGINE_LOOKUPS, prefix="dictionary.")
+        self.profiler.instrument(sys.modules[__name__], PROFILED_GAME_LOOKUPS,
+                                 prefix="dictionary.")
+
+    def write_warm_start_snapshot(self):
+        """
+        Snapshot the start of a game for the next launch, on a thread once the dictionary
+        is loaded. Written again on each launch, for the first kanjis to vary.
+        """
+        self.loader.join()
+        if not self.loader.error:
+            warm_start.write_snapshot(self.font_path)
 
     def run(self):
         """Main loop"""
 
-        while self.running:
+        while self.running and self.state.running:
+            if self.profiler:
+                self.profiler.start_frame()
             self.handle_events()
             self.process()
             self.render()
-
-        self.dump_words()
-
-        if self.hp == 0:
+            if self.startup:
+                self.startup.end_phase("first frame")
+                if self.profiler:
+                    print(self.startup.report_text())
+                self.startup = None
+            if self.profiler:
+                self.profiler.end_frame(self.profile_context())
+
+        self.state.dump_words()
+        if self.profiler:
+            self.profiler.write_summary()
+            print(f"Profile written to {PROFILE_FILEPATH}")
+        print(self.text_cache.stats_text())
+        print(ENTRY_CACHE.stats_text())
+        if self.state.joker_prefetcher:
+            print(self.state.joker_prefetcher.stats_text())
+        self.state.close()
+
+        if self.state.hp == 0:
             self.game_over()
 
+    def profile_context(self):
+        """What happened in the frame, for the slowest frames of the profile"""
+        context = f"(words {len(self.state.words)}, kanji {self.state.kanji_to_match}"
+        if self.validated_user_input is not None:
+            context += f", answered {self.validated_user_input!r}"
+        elif self.kana_input:
+            context += f", typing {self.kana_input.kana!r}"
+        return context + ")"
+
+    def get_events(self, timeout=None):
+        """
+        Events since the last call. With the event-driven loop, wait for at least one:
+        an input, or the end of the timeout (in seconds) if any.
+        """
+        if not EVENT_DRIVEN_LOOP or (timeout is not None and timeout <= 0):
+            return pygame.event.get()
+
+        if timeout is not None:
+            pygame.time.set_timer(WAKE_UP_EVENT, max(1, math.ceil(timeout * 1000)))
+        event = pygame.event.wait()
+        pygame.time.set_timer(WAKE_UP_EVENT, 0)
+        return [event] + pygame.event.get()
+
+    def next_frame_timeout(self):
+        """Seconds before the screen changes by itself: the next second of the timer or a fade"""
+        if self.full_redraw or self.state.timer == 0:
+            return 0
+        timeout = self.state.timer % 1 or 1
+
+        if self.state.warning_msg:
+            age = self.state.warning_msg_age()
+            if age < WARNING_MSG_FADE_START:
+                timeout = min(timeout, WARNING_MSG_FADE_START - age)
+            elif age < WARNING_MSG_FADE_START + WARNING_MSG_FADE_TIME:
+                # Fading: as many frames as the cap allows
+                timeout = 0
+
+        return timeout
+
     def handle_events(self):
         self.validated_user_input = None
-        events = pygame.event.get()
+        events = self.get_events(self.next_frame_timeout())
         for event in events:
             if exit_event(event):
                 self.running = False
@@ -207,16 +227,19 @@ class Game:
                 self.resize_screen(event.size)
             elif event.type == pygame.KEYDOWN:
                 if event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
-                    self.validated_user_input = self.user_input_value
-                    self.user_input_value = ""
+                    self.validated_user_input = self.kana_input.kana
+                    self.kana_input.clear()
                     pygame.event.clear()
                     return
                 elif event.key == pygame.K_BACKSPACE:
-                    self.user_input_value = self.user_input_value[:-1]
+                    self.kana_input.backspace()
                 else:
                     key = event.unicode
                     if re.match("[a-z]", key):
-                        self.user_input_value += key
+                        self.kana_input.append(key)
+
+    def render_text(self, font, text, color):
+        return self.text_cache.render(font, text, color)
 
     def resize_screen(self, size):
         old_screen = self.screen
@@ -229,263 +252,91 @@ class Game:
         self.screen.blit(old_screen, (0, 0))
         del old_screen
         pygame.display.update()
+        self.full_redraw = True
 
     def process(self):
         if not self.running:
             return
 
-        # Remove the msg as soon as user started to type
-        if self.user_input_value:
-            self.clear_warning_msg()
-
-        # Time up ?
-        if self.timer == 0:
-            self.set_warning_msg("Ran out of time ! Here is a word")
-            self.lose_hp()
-            # Special render to make the user wait !
-            self.render_warning_msg()
-            pygame.display.flip()
-
-            self.add_word(self.joker_word, players_choice=False)
-            pygame.event.clear()
-
-        # Pressed Enter with an empty form ? Unstuck the player
-        elif self.validated_user_input == "":
-            if self.hp == 1 and not self.free_joker:
-                self.set_warning_msg("Can't have a joker with only 心 left !")
-            elif not self.joker_word:
-                self.set_warning_msg("Sorry, no suggestion...")
-            else:
-                self.set_warning_msg("Giving up ? here is a word")
-                if not self.free_joker:
-                    self.lose_hp()
-
-                # Special render to make the user wait !
-                self.render_warning_msg()
-                pygame.display.flip()
-
-                self.add_word(self.joker_word, players_choice=False)
-                self.free_joker = False
-
-        # User validated a word proposal ?
-        elif self.validated_user_input:
-            self.process_validated_user_input()
-
-        dt = self.clock.tick(30) / 1000
-        self.timer -= dt
-        if self.timer < 0:
-            self.timer = 0
-
-    def process_validated_user_input(self):
-        higana_input = romkan.to_hiragana(self.validated_user_input)
-        # Check there is only hiragana
-        if re.match("[a-z]", higana_input):
-            self.set_warning_msg("Invalid input !")
-            return
-
-        valid_entries_by_kanji_form, errors = self.lookup_word_entries(higana_input)
+        self.choosing_word = False
+        word_added = self.state.process(self.validated_user_input,
+                                        typed_input=self.kana_input.kana)
+        if word_added:
+            pygame.event.clear()  # FIXME: does not prevent "double taps"
 
-        if not valid_entries_by_kanji_form:
-            if errors:
-                # error message have a digit at the beginning, to get the most precise error
-                error = sorted(errors)[0][1:]
-                self.set_warning_msg(error)
-            else:
-                self.set_warning_msg("No match ! press Enter again to give up")
-            self.lose_hp()
-            self.free_joker = True
-            return
+        self.limit_frame_rate()
 
-        print(f"Found {len(valid_entries_by_kanji_form.keys())} valid entries for {higana_input}")
-        for word in list(valid_entries_by_kanji_form.keys()):
-            if word in self.words:
-                print(f"Excluding word {word}: already used before")
-                del valid_entries_by_kanji_form[word]
+    def limit_frame_rate(self):
+        self.clock.tick(MAX_FPS)
 
-        if not valid_entries_by_kanji_form:
-            self.set_warning_msg("Already used, try something else")
-            return
-
-        candidates = sorted(valid_entries_by_kanji_form.keys(), key=word_to_freqrank)
+    def render_before_add_word(self, word, players_choice):
+        # Special render to make the user wait while the next kanji is prepared !
+        if not players_choice:
+            self.render_warning_msg()
+        elif not self.choosing_word:
+            self.render_validated_word(word)
+        pygame.display.flip()
 
-        if len(candidates) > 1:
-            new_word = self.choose_word(candidates)
-            if new_word is None:
-                return
+    def render(self):
+        # Record what each element would draw, then draw either everything or only what changed
+        elements_blits = []
+        for render_element in self.render_elements:
+            self.recorded_blits = []
+            render_element()
+            elements_blits.append(self.recorded_blits)
+        self.recorded_blits = None
+
+        if DIRTY_RECTS_RENDERING and not self.full_redraw:
+            self.render_dirty_rects(elements_blits)
         else:
-            new_word = candidates[0]
-            # Special render to make the user wait !
-            self.render_validated_word(new_word)
+            self.screen.fill(0)
+            for blits in elements_blits:
+                self.screen.blits(blits, doreturn=False)
             pygame.display.flip()
-
-        # Lose the free joker if any
-        self.free_joker = False
-
-        self.add_word(new_word)
-        pygame.event.clear()  # FIXME: does not prevent "double taps"
-
-    def lookup_word_entries(self, higana_input):
-        valid_entries_by_kanji_form = {}
-        errors = []
-
-        lookup_res = JMD.lookup(higana_input,
-                                strict_lookup=True, lookup_chars=False)
-        print(f"Lookup result for {higana_input}:")
-        for entry in lookup_res.entries:
-            for kanji_form in entry.kanji_forms:
-                word = str(kanji_form)
-                is_valid, error = self.valid_word_candidate(word)
-                if is_valid:
-                    valid_entries_by_kanji_form[word] = entry
-                    print(f"- {word}: OK")
-                    break
-                else:
-                    print(f"- {word}: {error}")
-                    errors.append(error)
-
-        return valid_entries_by_kanji_form, errors
-
-    def add_word(self, new_word, players_choice=True):
-        previous_kanji = self.kanji_to_match
-
-        # Remove the kanji to match from the list of kanjis to "collect"
-        if (
-                self.kanji_to_match in self.candidate_kanjis
-                and (players_choice or ALWAYS_CLEAR_KANJI)
-        ):
-            self.clear_kanji_to_match()
-
-        # Lookup the new word and add it to the history
-        lookup_res = JMD.lookup(new_word, strict_lookup=True, lookup_chars=False)
-        if not lookup_res.entries:
-            raise Exception(f"No entry found for {new_word} !")
-        entry = lookup_res.entries[0]
-        print(f"Added word {new_word}　({entry.senses[0].text()}) "
-              f"freqrank: {word_to_freqrank(new_word)}")
-        self.words[new_word] = entry
-
-        last_word = next(reversed(self.words))
-        if MATCH_LAST_KANJI:
-            self.kanji_to_match = last_word[-1]
-        else:
-            candidates = {kanji for kanji in last_word if
-                          (kanji in self.candidate_kanjis and kanji != previous_kanji)}
-            # If there are no kanjis for our level, pick a random kanji in the pool
-            if not candidates:
-                candidates = self.candidate_kanjis
-            self.kanji_to_match = random.choice(list(candidates))
-
-        has_possible_words = self.update_joker_word()
-        if not has_possible_words:
-            self.set_warning_msg(f"No words starting with {self.kanji_to_match}, here is a new one")
-            self.pick_new_kanji_and_joker_word()
-
-        self.update_score(players_choice, new_word, previous_kanji)
-
-        # Reset the timer !
-        self.timer = CONF["MAX_TIMER"]
-
-    def clear_kanji_to_match(self):
-        self.candidate_kanjis.remove(self.kanji_to_match)
-        # Did we clear all the kanjis up to selected grade ?
-        if not self.candidate_kanjis:
-            # Increase the grade
-            _kanjis_by_grade = kanjis_by_grade()
-
-            CONF['TARGET_KANJI_GRADE'] = next_grade(CONF['TARGET_KANJI_GRADE'])
-
-            if CONF['TARGET_KANJI_GRADE'] < MAX_KANJI_GRADE:
-                new_kanjis = _kanjis_by_grade[CONF['TARGET_KANJI_GRADE']]
-                self.candidate_kanjis.update(new_kanjis)
-                self.init_nb_candidate_kanjis += len(self.candidate_kanjis)
-            else:
-                # Restart from beginning: all the kanjis must be cleared again
-                CONF['TARGET_KANJI_GRADE'] = MAX_KANJI_GRADE
-                self.candidate_kanjis.update(self.valid_kanjis)
-
-    def update_score(self, players_choice, new_word, previous_kanji):
-        if not players_choice:
-            self.last_score_update = 0
+            self.full_redraw = False
+
+        self.previous_elements_blits = elements_blits
+
+    def render_dirty_rects(self, elements_blits):
+        changed = [
+            blits != previous_blits
+            for blits, previous_blits in zip(elements_blits, self.previous_elements_blits)
+        ]
+        dirty_rects = []
+        for idx, blits in enumerate(elements_blits):
+            if changed[idx]:
+                dirty_rects += [rect for _, rect in chain(blits, self.previous_elements_blits[idx])]
+
+        # Unchanged elements overlapping a dirty area are erased as well, so redraw them too
+        has_new_changes = True
+        while has_new_changes:
+            has_new_changes = False
+            for idx, blits in enumerate(elements_blits):
+                if not changed[idx] and any(rect.collidelist(dirty_rects) >= 0
+                                            for _, rect in blits):
+                    changed[idx] = True
+                    dirty_rects += [rect for _, rect in blits]
+                    has_new_changes = True
+
+        if not dirty_rects:
             return
 
-        score_update = self.compute_score_update(new_word, previous_kanji)
-        self.score += score_update
-        self.last_score_update = score_update
-        msg = f"正解！　+{score_update}点"
-
-        bonus_hp = 0
-        while self.score > self.last_1up_score:
-            bonus_hp += 1
-            self.last_1up_score *= 2
-
-        if bonus_hp:
-            self.hp += bonus_hp
-            msg = f"{msg}, +{bonus_hp}心 (次:{self.last_1up_score * 2}点)"
-
-        self.set_warning_msg(msg, color=YELLOW)
-
-    def update_joker_word(self) -> bool:
-        print("Look for a joker word with only candidate kanjis")
-        self.joker_word = self.find_one_valid_word()
-
-        # No more words ending with one of the remaining kanjis to match ?
-        # Get one outside these kanjis !
-        if not self.joker_word:
-            print("No word with a candidate kanjis, look for any word with the kanji to match")
-            self.joker_word = self.find_one_valid_word(candidate_kanjis_only=False)
-
-        # No word matching at all ?
-        if not self.joker_word:
-            return False
-
-        self.joker_word_sense = get_word_meaning(self.joker_word)
-        print(f"Joker is {self.joker_word} ({self.joker_word_sense})")
-        return True
-
-    def compute_score_update(self, new_word, previous_kanji):
-        self.combo += 1
-        grade_scores = self.compute_word_grade_scores(new_word, previous_kanji)
-        total_grade_score = sum(grade_scores)
-        no_hint_multiplier = 2 if (self.timer > CONF["HINT_TIME"]) else 1
-        score_update = total_grade_score * no_hint_multiplier * self.combo
-        print(
-            f"Score += ({'+'.join(map(str, grade_scores))}★) "
-            f"ｘ ({self.combo}◎) x ({no_hint_multiplier} タイマ)")
-        return score_update
-
-    def compute_word_grade_scores(self, word, previous_kanji):
-        scores = []
-        for char in word:
-            # Only reward for the "new" kanjis
-            if (
-                    char == previous_kanji or
-                    (char in self.valid_kanjis and char not in self.candidate_kanjis)
-            ):
-                grade = int(JMD.get_char(char).grade)
-                scores.append(KANJI_GRADE_TO_INFO[grade]['score'])
-        return scores
-
-    def clear_warning_msg(self):
-        self.warning_msg = None
-        self.warning_msg_start_ts = None
-
-    def set_warning_msg(self, new_msg, color=RED):
-        self.warning_msg = new_msg
-        self.warning_msg_start_ts = time.time()
-        self.warning_msg_color = color
-
-    def render(self):
-        self.screen.fill(0)
-
-        self.render_top_pane()
-        self.render_words()
-        self.render_hint()
-        self.render_prompt()
-        self.render_kanjis_counter()
-        self.render_combo_jauge()
-        self.render_warning_msg()
-
-        pygame.display.flip()
+        for rect in dirty_rects:
+            self.screen.fill(0, rect)
+        for idx, blits in enumerate(elements_blits):
+            if changed[idx]:
+                self.screen.blits(blits, doreturn=False)
+        pygame.display.update(dirty_rects)
+
+    def blit(self, surf, dest):
+        """Blit on the screen, or only record the blit while rendering the elements"""
+        rect = surf.get_rect(topleft=(dest[0], dest[1]))
+        if self.recorded_blits is not None:
+            self.recorded_blits.append((surf, rect))
+        else:
+            self.screen.blit(surf, rect)
+            # Drawn outside of the elements: the screen no longer matches what they recorded
+            self.full_redraw = True
 
     def render_top_pane(self):
         self.render_hps()
@@ -493,33 +344,34 @@ class Game:
         self.render_score()
 
     def render_hps(self):
-        hp_str = "心ｘ" + str(self.hp).ljust(2)
-        color = WHITE if self.hp > 1 else RED
-        hp_surf = self.font.render(hp_str, True, color)
+        hp_str = "心ｘ" + str(self.state.hp).ljust(2)
+        color = WHITE if self.state.hp > 1 else RED
+        hp_surf = self.render_text(self.font, hp_str, color)
         self.hp_rect = hp_surf.get_rect(topleft=(0, 0))
-        self.screen.blit(hp_surf, self.hp_rect)
+        self.blit(hp_surf, self.hp_rect)
 
     def render_timer(self):
-        timer_str = f"タイマ：{str(int(self.timer)).zfill(2)}　"
-        if self.timer <= 5:
+        timer_str = f"タイマ：{str(int(self.state.timer)).zfill(2)}　"
+        if self.state.timer <= 5:
             color = RED
-        elif self.timer < CONF["MAX_TIMER"] / 2:
+        elif self.state.timer < self.state.conf["MAX_TIMER"] / 2:
             color = YELLOW
         else:
             color = WHITE
-        timer_surf = self.font.render(timer_str, True, color)
+        timer_surf = self.render_text(self.font, timer_str, color)
         timer_rect = timer_surf.get_rect(top=0, centerx=self.screen_w / 2)
-        self.screen.blit(timer_surf, timer_rect)
+        self.blit(timer_surf, timer_rect)
 
     def render_score(self):
-        text, color = format_score(self.score, self.last_score_update, self.timer)
-        score_surf = self.font.render(text, True, color)
+        text, color = format_score(self.state.score, self.state.last_score_update,
+                                   self.state.timer, self.state.conf["MAX_TIMER"])
+        score_surf = self.render_text(self.font, text, color)
         score_rect = score_surf.get_rect(top=0, right=self.screen_w)
-        self.screen.blit(score_surf, score_rect)
+        self.blit(score_surf, score_rect)
 
     def render_words(self):
         nb_words_to_show = 5
-        last_words = list(self.words.keys())[-nb_words_to_show:]
+        last_words = self.state.words.last_words(nb_words_to_show)
         # Padding to get nb_to_show words
         padding = (nb_words_to_show - len(last_words)) * ['']
         words = padding + last_words
@@ -531,120 +383,120 @@ class Game:
             text_height = self.words_surf.get_height()
             top += text_height
 
-        color = GREEN if self.combo > 0 else WHITE
-        word_question = self.kanji_to_match + "？"
-        self.words_surf = self.large_font.render(word_question, True, color)
+        color = GREEN if self.state.combo > 0 else WHITE
+        word_question = self.state.kanji_to_match + "？"
+        self.words_surf = self.render_text(self.large_font, word_question, color)
         self.words_rect = self.words_surf.get_rect(top=top)
-        self.screen.blit(self.words_surf, self.words_rect)
+        self.blit(self.words_surf, self.words_rect)
 
-        meaning, grade = kanji_meaning_and_grade(self.kanji_to_match)
-        meaning_surf = self.small_font.render(meaning, True, color)
+        meaning, grade = kanji_meaning_and_grade(self.state.kanji_to_match)
+        meaning_surf = self.render_text(self.small_font, meaning, color)
         meaning_rect = meaning_surf.get_rect(topleft=self.words_rect.topright)
-        self.screen.blit(meaning_surf, meaning_rect)
+        self.blit(meaning_surf, meaning_rect)
 
-        grade_surf = self.small_font.render(grade_text(grade), True, GRAY)
+        grade_surf = self.render_text(self.small_font, grade_text(grade), GRAY)
         grade_rect = grade_surf.get_rect(topleft=meaning_rect.bottomleft)
-        self.screen.blit(grade_surf, grade_rect)
+        self.blit(grade_surf, grade_rect)
 
     def render_word(self, word, top, alpha):
-        self.words_surf = self.font.render(word, True, BLUE)
+        self.words_surf = self.render_text(self.font, word, BLUE)
         self.words_rect = self.words_surf.get_rect(top=top)
-        self.screen.blit(self.words_surf, self.words_rect)
+        self.blit(self.words_surf, self.words_rect)
 
         if len(word) > 0:
-            entry = self.words[word]
-            furigana = str(entry.kana_forms[0])
-            furigana_surf = self.small_font.render("　" + furigana, True, BLUE)
+            record = lookup_word(word)
+            furigana = record.kana
+            furigana_surf = self.render_text(self.small_font, "　" + furigana, BLUE)
             furigana_rect = furigana_surf.get_rect(topleft=self.words_rect.topright)
-            self.screen.blit(furigana_surf, furigana_rect)
+            self.blit(furigana_surf, furigana_rect)
 
-            sense = entry.senses[0].text()
-            sense_surf = self.small_font.render("　" + sense, True, BLUE)
+            sense = record.sense
+            sense_surf = self.render_text(self.small_font, "　" + sense, BLUE)
             sense_rect = sense_surf.get_rect(topleft=furigana_rect.topright)
-            self.screen.blit(sense_surf, sense_rect)
+            self.blit(sense_surf, sense_rect)
 
-        alpha_surf = pygame.Surface((self.screen_w, self.words_surf.get_height()))
-        alpha_surf.fill(0)
-        alpha_surf.set_alpha(alpha)
-        self.screen.blit(alpha_surf, (0, top))
+        alpha_surf = self.text_cache.shade((self.screen_w, self.words_surf.get_height()), alpha)
+        self.blit(alpha_surf, (0, top))
 
     def render_hint(self):
-        if self.timer < CONF["HINT_TIME"] and self.joker_word_sense:
-            hint_str = "ヒント：" + self.joker_word_sense
-            hint_surf = self.small_font.render(hint_str, True, WHITE)
+        if self.state.timer < self.state.conf["HINT_TIME"] and self.state.joker_word_sense:
+            hint_str = "ヒント：" + self.state.joker_word_sense
+            hint_surf = self.render_text(self.small_font, hint_str, WHITE)
             hint_rect = hint_surf.get_rect(topleft=self.words_rect.bottomleft)
-            self.screen.blit(hint_surf, hint_rect)
+            self.blit(hint_surf, hint_rect)
 
     def render_validated_word(self, word):
         text = word
-        surf = self.large_font.render(text, True, WHITE)
+        surf = self.render_text(self.large_font, text, WHITE)
         rect = surf.get_rect(topleft=self.words_rect.bottomleft)
         self.screen.fill(0, rect)
         self.screen.blit(surf, rect)
+        self.full_redraw = True
 
     def render_warning_msg(self):
-        if self.warning_msg:
-            fade_threshold = 1
-            ellapsed = time.time() - self.warning_msg_start_ts
-            if ellapsed > fade_threshold:
-                alpha = min((ellapsed - fade_threshold) * 255, 255)
+        if self.state.warning_msg:
+            ellapsed = self.state.warning_msg_age()
+            if ellapsed > WARNING_MSG_FADE_START:
+                alpha = min((ellapsed - WARNING_MSG_FADE_START) / WARNING_MSG_FADE_TIME * 255, 255)
             else:
                 alpha = 0
 
             if alpha >= 255:
                 return
 
-            warning_msg_surf = self.font.render(self.warning_msg, True, self.warning_msg_color)
+            color = RED if self.state.warning_msg_is_error else YELLOW
+            warning_msg_surf = self.render_text(self.font, self.state.warning_msg, color)
             warning_msg_rect = warning_msg_surf.get_rect(bottomleft=self.prompt_rect.topleft)
-            black_surf = pygame.Surface((self.screen_w, warning_msg_surf.get_height()))
-            black_surf.fill(0)
-            self.screen.blit(black_surf, warning_msg_rect)
-            self.screen.blit(warning_msg_surf, warning_msg_rect)
-            black_surf.set_alpha(alpha)
-            self.screen.blit(black_surf, warning_msg_rect)
+            black_size = (self.screen_w, warning_msg_surf.get_height())
+            self.blit(self.text_cache.shade(black_size), warning_msg_rect)
+            self.blit(warning_msg_surf, warning_msg_rect)
+            self.blit(self.text_cache.shade(black_size, int(alpha)), warning_msg_rect)
 
     def render_prompt(self):
-        self.prompt = self.large_font.render('>', True, BLUE)
+        self.prompt = self.render_text(self.large_font, '>', BLUE)
         self.prompt_rect = self.prompt.get_rect(bottomleft=(0, self.screen_h))
-        self.screen.blit(self.prompt, self.prompt_rect)
-
-        if self.user_input_value:
-            text = romkan.to_hiragana(self.user_input_value)
-            color = GREEN
-        else:  #elif not self.words:
+        self.blit(self.prompt, self.prompt_rect)
+
+        if self.kana_input:
+            text = self.kana_input.kana
+            if self.kana_input.invalid:
+                color = RED
+            elif not self.state.typed_input_has_words:
+                # No word for the kanji to match starts with that reading
+                color = ORANGE
+            else:
+                color = GREEN
+        else:  #elif not self.state.words:
             # First kanji ? show a message to help new players
-            text = f"Type a word with {self.kanji_to_match}"
+            text = f"Type a word with {self.state.kanji_to_match}"
             color = GRAY
         # else:
         #     text = ""
         #     color = GREEN
 
-        self.user_input = self.large_font.render(text, True, color)
+        self.user_input = self.render_text(self.large_font, text, color)
         self.user_input_rect = self.user_input.get_rect(topleft=self.prompt_rect.topright)
-        self.screen.blit(self.user_input, self.user_input_rect)
+        self.blit(self.user_input, self.user_input_rect)
+
+    def render_profile_overlay(self):
+        overlay_surf = self.render_text(self.small_font, self.profiler.overlay_text(), GRAY)
+        self.blit(overlay_surf, overlay_surf.get_rect(topright=(self.screen_w, 0)))
 
     def render_kanjis_counter(self):
         bottom = self.prompt_rect.top
         right = self.screen_w
-        text = self.kanjis_counter_text()
-        kanjis_counter_surf = self.small_font.render(text, True, WHITE)
+        text = self.state.kanjis_counter_text()
+        kanjis_counter_surf = self.render_text(self.small_font, text, WHITE)
         self.kanjis_counter_rect = kanjis_counter_surf.get_rect(bottom=bottom, right=right)
-        self.screen.blit(kanjis_counter_surf, self.kanjis_counter_rect)
-
-    def kanjis_counter_text(self):
-        grade_score = KANJI_GRADE_TO_INFO[CONF['TARGET_KANJI_GRADE']]['score']
-        return (
-            f"{grade_score * '★'}漢字 "
-            f"{len(self.candidate_kanjis)}／{self.init_nb_candidate_kanjis}"
-        )
+        self.blit(kanjis_counter_surf, self.kanjis_counter_rect)
 
     def render_combo_jauge(self):
         top = self.hp_rect.bottom
         right = self.screen_w
-        for _ in range(self.combo):
-            combo_surf = self.small_font.render("◎", True, YELLOW)
+        for _ in range(self.state.combo):
+            combo_surf = self.render_text(self.small_font, "◎", YELLOW)
             combo_rect = combo_surf.get_rect(top=top, right=right)
-            self.screen.blit(combo_surf, combo_rect)
+            self.blit(combo_surf, combo_rect)
             text_height = combo_surf.get_height()
             top += text_height
             if top + text_height >= self.kanjis_counter_rect.top:
@@ -652,11 +504,18 @@ class Game:
                 right -= combo_surf.get_width()
 
     def choose_word(self, candidates: List[str]) -> Optional[str]:
+        self.choosing_word = True
         cursor = 0
         done = False
         cancel = False
+        redraw = True
         while not done:
-            events = pygame.event.get()
+            if redraw:
+                self.render_choose_word(candidates, cursor)
+                redraw = False
+            self.clock.tick(MAX_FPS)
+
+            events = self.get_events()
             for event in events:
                 if exit_event(event):
                     self.running = False
@@ -664,7 +523,9 @@ class Game:
                     break
                 elif event.type == pygame.VIDEORESIZE:
                     self.resize_screen(event.size)
+                    redraw = True
                 elif event.type == pygame.KEYDOWN:
+                    redraw = True
                     if event.key == pygame.K_ESCAPE:
                         done = True
                         cancel = True
@@ -684,8 +545,6 @@ class Game:
                             cursor = 0
                         break
 
-            self.render_choose_word(candidates, cursor)
-
         if not cancel:
             self.render_choose_word(candidates, cursor, only_selection=True)
             return candidates[cursor]
@@ -693,9 +552,10 @@ class Game:
             return None
 
     def render_choose_word(self, candidates, cursor, only_selection=False):
+        self.full_redraw = True
         top = self.words_rect.bottom
 
-        surf = self.font.render("Choose a word using ↑, ↓ and Enter", True, WHITE)
+        surf = self.render_text(self.font, "Choose a word using ↑, ↓ and Enter", WHITE)
         rect = surf.get_rect(top=top, left=0)
         self.screen.fill(0, rect)
         if not only_selection:
@@ -704,13 +564,13 @@ class Game:
 
         for idx, word in enumerate(candidates):
             cursor_txt = ">" if idx == cursor and not only_selection else " "
-            cursor_surf = self.large_font.render(cursor_txt, True, GREEN)
+            cursor_surf = self.render_text(self.large_font, cursor_txt, GREEN)
             cursor_rect = cursor_surf.get_rect(top=top, left=0)
             self.screen.fill(0, cursor_rect)
             self.screen.blit(cursor_surf, cursor_rect)
 
             color = GREEN if idx == cursor else GRAY
-            surf = self.large_font.render(word, True, color)
+            surf = self.render_text(self.large_font, word, color)
             rect = surf.get_rect(top=top, left=cursor_rect.right)
 
             self.screen.fill(0, rect)
@@ -720,24 +580,33 @@ class Game:
             top += surf.get_height()
 
         pygame.display.flip()
-        self.clock.tick(30)
 
     def options_screen(self):
-        global CONF
         modes = list(CONFS.keys())
         cursor = 0
+        self.render_options_screen(modes, cursor)
+        self.startup.end_phase("options screen")
+        redraw = False
         while True:
-            events = pygame.event.get()
+            # Only redraw when the selection changed
+            if redraw:
+                self.render_options_screen(modes, cursor)
+                redraw = False
+            self.clock.tick(MAX_FPS)
+
+            events = self.get_events()
             for event in events:
                 if exit_event(event):
                     pygame.quit()
                     sys.exit(0)
                 elif event.type == pygame.VIDEORESIZE:
                     self.resize_screen(event.size)
+                    redraw = True
                 elif event.type == pygame.KEYDOWN:
+                    redraw = True
                     if event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
-                        CONF = CONFS[modes[cursor]]
-                        return
+                        self.startup.end_phase("choosing the difficulty", idle=True)
+                        return modes[cursor]
                     elif event.key == pygame.K_LEFT:
                         cursor -= 1
                         if cursor < 0:
@@ -749,19 +618,19 @@ class Game:
                             cursor = 0
                         break
 
-            self.render_options_screen(modes, cursor)
-
     def render_options_screen(self, modes, cursor):
 
         self.screen.fill(0)
         top = 0
 
-        surf = self.font.render(f"Choose difficulty with ← and →, then press Enter", True, WHITE)
+        surf = self.render_text(self.font, f"Choose difficulty with ← and →, then press Enter",
+                                WHITE)
         rect = surf.get_rect(top=top, left=0)
         self.screen.blit(surf, rect)
         top += surf.get_height()
 
-        surf = self.large_font.render(f"Difficulty: < {modes[cursor].ljust(10)} >", True, YELLOW)
+        surf = self.render_text(self.large_font, f"Difficulty: < {modes[cursor].ljust(10)} >",
+                                YELLOW)
         rect = surf.get_rect(top=top, left=0)
         self.screen.blit(surf, rect)
         top += 2 * surf.get_height()
@@ -770,38 +639,53 @@ class Game:
         for conf_key in CONF_KEYS:
             key_text, value_text = conf_item_to_text(conf, conf_key)
             text = f"{key_text}: {value_text}"
-            surf = self.font.render(text, True, GRAY)
+            surf = self.render_text(self.font, text, GRAY)
             rect = surf.get_rect(top=top, left=0)
             self.screen.blit(surf, rect)
             top += surf.get_height()
 
         pygame.display.flip()
-        self.clock.tick(30)
 
     def loading_screen(self):
+        """Wait for the resources needed to start a game, the others are loaded while playing"""
+        while self.loader.is_alive() and not self.loader.game_start_loaded:
+            events = pygame.event.get()
+            for event in events:
+                if exit_event(event):
+                    pygame.quit()
+                    sys.exit(0)
+                elif event.type == pygame.VIDEORESIZE:
+                    self.resize_screen(event.size)
+
+            nb_loaded, _, resource_name = self.loader.progress
+            self.render_loading_screen(min(nb_loaded, len(GAME_START_RESOURCES)),
+                                       len(GAME_START_RESOURCES), resource_name)
+            self.clock.tick(MAX_FPS)
+
+        if self.loader.error:
+            raise self.loader.error
+
+    def render_loading_screen(self, nb_loaded, nb_resources, resource_name):
         self.screen.fill(0)
-        loading = self.large_font.render('読み込み中...', True, GREEN)
+        loading = self.render_text(self.large_font, '読み込み中...', GREEN)
         loading_rect = loading.get_rect()
         loading_rect.center = (self.screen_w / 2, self.screen_h / 2)
         self.screen.blit(loading, loading_rect)
-        pygame.display.flip()
 
-    def dump_words(self):
-        if not self.words:
-            return
-
-        with open("log", "w") as outfile:
-            print(f"Score: {self.score}", file=outfile)
-            print(self.kanjis_counter_text(), file=outfile)
-            rarest_word = sorted(self.words.keys(), key=word_to_freqrank)[-1]
-            rarest_entry = self.words[rarest_word]
-            print(f"Rarest word: {rarest_word} {rarest_entry.kana_forms[0]} "
-                  f"{rarest_entry.senses[0].text()}",
-                  file=outfile)
+        bar_rect = pygame.Rect(0, 0, loading_rect.width, 10)
+        bar_rect.midtop = loading_rect.midbottom
+        pygame.draw.rect(self.screen, GRAY, bar_rect, 1)
+        done_rect = bar_rect.copy()
+        done_rect.width = int(bar_rect.width * nb_loaded / nb_resources)
+        self.screen.fill(GREEN, done_rect)
+
+        if resource_name:
+            text = f"{resource_name} ({nb_loaded + 1}/{nb_resources})"
+            surf = self.render_text(self.small_font, text, GRAY)
+            rect = surf.get_rect(midtop=bar_rect.midbottom)
+            self.screen.blit(surf, rect)
 
-            print("Words list:", file=outfile)
-            for word, entry in self.words.items():
-                print(f"- {word} {entry.kana_forms[0]} {entry.senses[0].text()}", file=outfile)
+        pygame.display.flip()
 
     def game_over(self):
         # Fade the screen
@@ -811,130 +695,35 @@ class Game:
         self.screen.blit(alpha_surf, (0, 0))
 
         # Show "the end"
-        surf = self.large_font.render("終", True, RED)
+        surf = self.render_text(self.large_font, "終", RED)
         rect = surf.get_rect()
         rect.center = (self.screen_w / 2, self.screen_h / 2)
         self.screen.blit(surf, rect)
 
+        # Longest chain of the game, and the one to beat if the chains were solved
+        # (the solver is only imported here, not to slow down the startup)
+        from .chains import load_chains, target_chain
+
+        chain_text = f"連鎖 {self.state.best_combo}"
+        target = target_chain(self.state.conf["TARGET_KANJI_GRADE"], load_chains())
+        if target is not None:
+            chain_text += f"／{target.length}　{'→'.join(target.words[:3])}"
+            if len(target.words) > 3:
+                chain_text += "→..."
+        surf = self.render_text(self.small_font, chain_text, WHITE)
+        self.screen.blit(surf, surf.get_rect(midtop=rect.midbottom))
+
         pygame.display.flip()
 
         time.sleep(1)
 
         # Wait for user to press any key
         while True:
-            events = pygame.event.get()
+            events = self.get_events()
             for event in events:
                 if exit_event(event) or event.type == pygame.KEYDOWN:
                     return
-            self.clock.tick(30)
-
-    def init_candidate_kanjis(self):
-        _kanjis_by_grade = kanjis_by_grade()
-
-        self.candidate_kanjis = set()
-        self.valid_kanjis = set()
-        for grade in KANJI_GRADES:
-            self.valid_kanjis.update(_kanjis_by_grade[grade])
-            if grade <= CONF['TARGET_KANJI_GRADE']:
-                self.candidate_kanjis.update(_kanjis_by_grade[grade])
-
-        self.init_nb_candidate_kanjis = len(self.candidate_kanjis)
-
-    def pick_new_kanji_and_joker_word(self):
-        kanjis = list(self.candidate_kanjis)
-        while True:
-            self.kanji_to_match = random.choice(kanjis)
-            has_possible_words = self.update_joker_word()
-            if has_possible_words:
-                return
-            # Could not find any valid word with that kanji, will try another
-            print(f"Could not find a word starting with {self.kanji_to_match} !")
-            kanjis.remove(self.kanji_to_match)
-
-    def find_one_valid_word(self, candidate_kanjis_only=True):
-        candidate_words = set()
-        query = f"{self.kanji_to_match}%" if MATCH_LAST_KANJI else f"%{self.kanji_to_match}%"
-        lookup_res = JMD.lookup(query, strict_lookup=True, lookup_chars=False)
-        for entry in lookup_res.entries:
-            for kanji_form in entry.kanji_forms:
-                word = str(kanji_form)
-                if word in self.words:
-                    # Don't want already seen words
-                    continue
-                is_valid, _ = self.valid_word_candidate(word)
-                if is_valid:
-                    # Avoid kanjis that are not outside our grade
-                    if (
-                            candidate_kanjis_only is False
-                            or not any((
-                            kanji in self.valid_kanjis and kanji not in self.candidate_kanjis
-                            for kanji in word
-                    ))
-                    ):
-                        candidate_words.add(word)
-
-        if candidate_words:
-            print(f"Found {len(candidate_words)} possible words for {self.kanji_to_match}")
-            word_freqrank_pairs = []
-            for word in candidate_words:
-                freqrank = word_to_freqrank(word)
-                if freqrank != sys.maxsize:
-                    word_freqrank_pairs.append((word, freqrank))
-
-            if word_freqrank_pairs:
-                sorted_words = sorted(word_freqrank_pairs, key=operator.itemgetter(1))
-                for word, freqrank in sorted_words[:10]:
-                    print(f"- {word} ({freqrank})")
-                # Randomize a bit
-                return random.choice(sorted_words[:JOKER_WORD_POOL_SIZE])[0]
-            else:
-                return random.choice(list(candidate_words))
-
-        return None
-
-    def lose_hp(self):
-        self.hp -= 1
-        self.combo = 0
-        # Game over ?
-        if self.hp == 0:
-            self.running = False
-
-    def valid_word_candidate(self, word):
-        if MATCH_LAST_KANJI and not word.startswith(self.kanji_to_match):
-            return False, f'4 Word must start with {self.kanji_to_match}'
-        if self.kanji_to_match not in word:
-            return False, f'3 Word must contain {self.kanji_to_match}'
-        if len(word) < WORDS_MIN_LENGTH:
-            return False, f'2 Word must be {WORDS_MIN_LENGTH}+ character'
-
-        kanjis = self.get_word_kanjis(word)
-
-        if len(kanjis) < WORDS_MIN_NB_KANJI:
-            return False, f'1 Word must contain {WORDS_MIN_NB_KANJI}+ kanji'
-
-        return True, None
-
-    def get_word_kanjis(self, word):
-        kanjis = []
-        for char in word:
-            if char in self.valid_kanjis:
-                kanjis.append(char)
-        return kanjis
-
-
-def get_word_meaning(word):
-    lookup_res = JMD.lookup(word, strict_lookup=True, lookup_chars=False)
-    if not lookup_res.entries:
-        raise Exception(f"No entry found for {word} !")
-    entry = lookup_res.entries[0]
-    return entry.senses[0].text()
-
-
-def kanji_meaning_and_grade(kanji):
-    entry = JMD.get_char(kanji)
-    meaning = ", ".join((m.value for m in entry.rm_groups[0].meanings if m.m_lang == ''))
-    grade = int(entry.grade) if entry.grade else None
-    return meaning, grade
+            self.clock.tick(MAX_FPS)
 
 
 def grade_text(grade):
@@ -946,45 +735,14 @@ def grade_text(grade):
     raise Exception(f"Grade {grade} is not used in the game !")
 
 
-def next_grade(grade):
-    idx = KANJI_GRADES.index(grade)
-    if idx == len(KANJI_GRADES) - 1:
-        return idx
-    return idx + 1
-
-
-def kanjis_by_grade():
-    def compute_kanjis_by_grade():
-        _kanjis_by_grade = defaultdict(set)
-        for kanji in JMD.kd2_xml.char_map.values():
-            if kanji.grade is not None:
-                _kanjis_by_grade[int(kanji.grade)].add(kanji.literal)
-        return _kanjis_by_grade
-
-    cache_filepath = "data/kanjis_grade"
-
-    if os.path.isfile(cache_filepath):
-        print("Loading kanjis from cache")
-        with open(cache_filepath, "rb") as cache_file:
-            _kanjis_by_grade = pickle.load(cache_file)
-
-    else:
-        print("Save kanjis to cache")
-        _kanjis_by_grade = compute_kanjis_by_grade()
-        with open(cache_filepath, "wb") as cache_file:
-            pickle.dump(_kanjis_by_grade, cache_file)
-
-    return _kanjis_by_grade
-
-
-def format_score(score, last_score_update, timer):
+def format_score(score, last_score_update, timer, max_timer):
     score_padding = 5
     big_score = score >= 10 ** score_padding
     if big_score:
         score_padding = score_padding + 4
 
     # Temporarily show the update instead of the total ?
-    if CONF["MAX_TIMER"] - timer < 3 and last_score_update:
+    if max_timer - timer < 3 and last_score_update:
         text = ("+" + str(last_score_update)).rjust(score_padding)
         color = YELLOW
     else:
@@ -1018,6 +776,10 @@ def conf_item_to_text(conf, conf_key):
     return key_text, value_text
 
 
+def get_font_path():
+    return pygame.font.match_font(get_font_family())
+
+
 def get_font_family():
     installed_fonts = set(pygame.font.get_fonts())
     candidate_fonts = ["umegothic", "notosanscjkjp", "takaogothic", "takaomincho"]
@@ -1038,8 +800,9 @@ def exit_event(event):
     )
 
 
-def main():
-    Game().run()
+def main(profile=False, profile_overlay=False, startup=None):
+    profiler = Profiler() if profile or profile_overlay else None
+    Game(profiler=profiler, profile_overlay=profile_overlay, startup=startup).run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+import re
+
+import romkan
+
+VOWELS = "aiueo"
+LATIN_PATTERN = re.compile("[a-z]")
+# Letters of a syllable being typed, and a ん that could be the start of a な, に...
+UNSETTLED_END_PATTERN = re.compile("[a-zん]+$")
+
+
+def to_hiragana(text):
+    """Hiragana of a romaji (or already hiragana) text, letters that can't be converted are kept"""
+    if not LATIN_PATTERN.search(text):
+        return text
+    return romkan.to_hiragana(text)
+
+
+def settled_prefix(kana):
+    """Start of a kana input being typed that the next keys can't change"""
+    return UNSETTLED_END_PATTERN.sub("", kana)
+
+
+class KanaInput:
+    """
+    Romaji typed by the player, converted to hiragana one key at a time.
+
+    Every romaji syllable ends with a vowel (or is a "n"), so the romaji before the last typed
+    vowel converts the same way whatever follows: only the letters typed since then are
+    converted again on each key. The result is the same as romkan.to_hiragana(self.romaji).
+    """
+
+    def __init__(self):
+        self.romaji = ""
+        self.kana = ""
+        self._chunks = []  # (kana before the chunk, chunk romaji) of each chunk ending with a vowel
+        self._done_kana = ""  # Kana of the chunks
+        self._tail = ""  # Romaji typed since the last vowel
+        self._nb_invalid_chunks = 0
+
+    def __bool__(self):
+        return bool(self.romaji)
+
+    @property
+    def invalid(self):
+        """True if letters before the last vowel could not be converted to hiragana"""
+        return self._nb_invalid_chunks > 0
+
+    def append(self, char):
+        self.romaji += char
+        self._tail += char
+        if char in VOWELS:
+            chunk_kana = romkan.to_hiragana(self._tail)
+            self._chunks.append((self._done_kana, self._tail))
+            self._done_kana += chunk_kana
+            self._nb_invalid_chunks += bool(LATIN_PATTERN.search(chunk_kana))
+            self._tail = ""
+        self._update_kana()
+
+    def backspace(self):
+        if not self.romaji:
+            return
+        self.romaji = self.romaji[:-1]
+        if self._tail:
+            self._tail = self._tail[:-1]
+        else:
+            self._done_kana, chunk = self._chunks.pop()
+            if LATIN_PATTERN.search(romkan.to_hiragana(chunk)):
+                self._nb_invalid_chunks -= 1
+            self._tail = chunk[:-1]
+        self._update_kana()
+
+    def clear(self):
+        self.__init__()
+
+    def _update_kana(self):
+        self.kana = self._done_kana + (romkan.to_hiragana(self._tail) if self._tail else "")
@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+class Prefetcher:
+    """
+    Compute values ahead of time on a thread pool, for when they are needed.
+
+    Results are keyed by the arguments they were computed from: a key that no longer matches
+    the current state is simply never asked for, and is dropped on clear() or when more than
+    max_size results are kept (the oldest first).
+    """
+
+    def __init__(self, compute, max_workers=2, max_size=16, name="prefetch"):
+        self.compute = compute
+        self.max_workers = max_workers
+        self.max_size = max_size
+        self.name = name
+        self.futures = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.drops = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def prefetch(self, key, *args):
+        with self._lock:
+            if key in self.futures:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=self.name)
+            self.futures[key] = self._executor.submit(self.compute, *args)
+            while len(self.futures) > self.max_size:
+                _, future = self.futures.popitem(last=False)
+                future.cancel()
+                self.drops += 1
+
+    def get(self, key):
+        """Prefetched value for the key, or None if it was not (or not yet) prefetched"""
+        with self._lock:
+            future = self.futures.pop(key, None)
+        # Not started yet ? computing it in the caller's thread is faster than waiting
+        if future is None or future.cancel():
+            self.misses += 1
+            return None
+
+        try:
+            value = future.result()
+        except CancelledError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            for future in self.futures.values():
+                future.cancel()
+            self.drops += len(self.futures)
+            self.futures.clear()
+
+    def shutdown(self):
+        self.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats_text(self):
+        nb_gets = self.hits + self.misses
+        hit_rate = self.hits / nb_gets if nb_gets else 0
+        return (
+            f"{self.name.capitalize()}: {self.hits} hits, {self.misses} misses "
+            f"({hit_rate:.1%} hit rate), {self.drops} dropped"
+        )
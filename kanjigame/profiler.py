@@ -0,0 +1,190 @@
+import bisect
+import functools
+import threading
+import time
+from collections import OrderedDict, deque
+
+PROFILE_FILEPATH = "profile"  # Written next to the words log when the game exits
+ROLLING_WINDOW = 1000  # Number of recent durations kept for each phase
+HISTOGRAM_BOUNDS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000]
+NB_SLOWEST_FRAMES = 10  # Number of the slowest frames detailed in the summary
+
+
+class PhaseStats:
+    """Durations (in seconds) of one phase: the recent ones, and a histogram of all of them"""
+
+    def __init__(self):
+        self.recent = deque(maxlen=ROLLING_WINDOW)
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, duration):
+        self.recent.append(duration)
+        self.histogram[bisect.bisect_right(HISTOGRAM_BOUNDS_MS, duration * 1000)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def percentile(self, ratio):
+        """Percentile of the recent durations"""
+        if not self.recent:
+            return 0
+        durations = sorted(self.recent)
+        return durations[min(len(durations) - 1, int(ratio * len(durations)))]
+
+
+class Profiler:
+    """
+    Time the phases of the main loop, e.g. Profiler.wrap(game.process, "process").
+
+    Phases can be nested: the time spent in an idle phase (waiting for the player) is not counted
+    in the phases around it. Each iteration of the main loop is a frame: the slowest frames
+    are kept with the time of each of their phases, to trace slow turns to a cause.
+    Only the calls from the thread that created the profiler are timed.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.phases = OrderedDict()
+        self.frames = PhaseStats()
+        self.frame_timestamps = deque(maxlen=ROLLING_WINDOW)
+        self.slowest_frames = []  # (duration, frame index, context, phase durations), slowest first
+        self._thread = threading.current_thread()
+        self._stack = []  # [phase name, start, idle time] of the phases being timed
+        self._frame_start = None
+        self._frame_idle = 0
+        self._frame_phases = {}
+        self.startup = None  # StartupTimer, reported at the start of the summary
+
+    def wrap(self, func, name=None, idle=False):
+        name = name or func.__name__
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            if threading.current_thread() is not self._thread:
+                return func(*args, **kwargs)
+            self.start_phase(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.end_phase(idle)
+
+        return timed
+
+    def instrument(self, obj, method_names, prefix="", idle=False):
+        """Replace methods of an object (or functions of a module) by timed versions"""
+        for method_name in method_names:
+            method = getattr(obj, method_name)
+            setattr(obj, method_name, self.wrap(method, prefix + method_name, idle))
+
+    def start_phase(self, name):
+        self._stack.append([name, self.clock(), 0])
+
+    def end_phase(self, idle=False):
+        name, start, idle_time = self._stack.pop()
+        elapsed = self.clock() - start
+        if idle:
+            idle_time = elapsed
+        else:
+            self.phases.setdefault(name, PhaseStats()).add(elapsed - idle_time)
+            self._frame_phases[name] = self._frame_phases.get(name, 0) + elapsed - idle_time
+        if self._stack:
+            self._stack[-1][2] += idle_time
+        else:
+            self._frame_idle += idle_time
+
+    def start_frame(self):
+        self._frame_start = self.clock()
+        self._frame_idle = 0
+        self._frame_phases = {}
+
+    def end_frame(self, context=""):
+        """context: what was going on, to be shown with the slowest frames"""
+        if self._frame_start is None:
+            return
+        now = self.clock()
+        duration = now - self._frame_start - self._frame_idle
+        self.frames.add(duration)
+        self.frame_timestamps.append(now)
+
+        if (
+                len(self.slowest_frames) < NB_SLOWEST_FRAMES
+                or duration > self.slowest_frames[-1][0]
+        ):
+            self.slowest_frames.append((duration, self.frames.count, context, self._frame_phases))
+            self.slowest_frames.sort(key=lambda frame: -frame[0])
+            del self.slowest_frames[NB_SLOWEST_FRAMES:]
+        self._frame_start = None
+
+    def fps(self, period=1):
+        """Number of frames per second, over the last period (in seconds)"""
+        now = self.clock()
+        nb_frames = sum(1 for timestamp in self.frame_timestamps if now - timestamp <= period)
+        return nb_frames / period
+
+    def overlay_text(self):
+        return (
+            f"{self.fps():.0f} FPS  frame p50 {self.frames.percentile(0.5) * 1000:.1f}ms "
+            f"p95 {self.frames.percentile(0.95) * 1000:.1f}ms "
+            f"max {self.frames.max * 1000:.1f}ms"
+        )
+
+    def summary_text(self):
+        lines = []
+        if self.startup:
+            lines += [self.startup.report_text(), ""]
+        lines += [f"Durations in ms, percentiles over the last {ROLLING_WINDOW} calls",
+                  "(phases include the phases they call, not the time waiting for the player)"]
+        lines.append(f"{'phase':<36}{'calls':>8}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}")
+        for name, stats in [("frame", self.frames)] + list(self.phases.items()):
+            mean = stats.total / stats.count if stats.count else 0
+            lines.append(
+                f"{name:<36}{stats.count:>8}{mean * 1000:>9.2f}"
+                f"{stats.percentile(0.5) * 1000:>9.2f}{stats.percentile(0.95) * 1000:>9.2f}"
+                f"{stats.max * 1000:>9.2f}"
+            )
+
+        lines.append("")
+        lines.append("Histograms (number of calls per duration)")
+        bounds = [f"<{bound}ms" for bound in HISTOGRAM_BOUNDS_MS]
+        bounds.append(f">{HISTOGRAM_BOUNDS_MS[-1]}ms")
+        for name, stats in [("frame", self.frames)] + list(self.phases.items()):
+            buckets = [f"{bound} {count}" for bound, count in zip(bounds, stats.histogram) if count]
+            lines.append(f"{name}: " + ", ".join(buckets))
+
+        lines.append("")
+        lines.append("Slowest frames")
+        for duration, frame_idx, context, phases in self.slowest_frames:
+            lines.append(f"- frame {frame_idx}: {duration * 1000:.2f}ms {context}")
+            for name, phase_duration in sorted(phases.items(), key=lambda item: -item[1]):
+                lines.append(f"    {name}: {phase_duration * 1000:.2f}ms")
+        return "\n".join(lines)
+
+    def write_summary(self, filepath=PROFILE_FILEPATH):
+        with open(filepath, "w") as outfile:
+            print(self.summary_text(), file=outfile)
+
+
+class StartupTimer:
+    """Durations of the consecutive phases of the startup, until the first frame of the game"""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._last = clock()
+        self.phases = []  # (name, duration, idle)
+
+    def end_phase(self, name, idle=False):
+        """The phase started at the end of the previous one. idle: waiting for the player"""
+        now = self.clock()
+        self.phases.append((name, now - self._last, idle))
+        self._last = now
+
+    def report_text(self):
+        total = sum(duration for _, duration, idle in self.phases if not idle)
+        lines = [f"Startup in {total * 1000:.0f}ms (without the time waiting for the player)"]
+        for name, duration, idle in self.phases:
+            waiting = " (waiting for the player)" if idle else ""
+            lines.append(f"- {name}: {duration * 1000:.0f}ms{waiting}")
+        return "\n".join(lines)
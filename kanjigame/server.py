@@ -0,0 +1,351 @@
+"""
+Game server: many sessions played at once over TCP, in a single asyncio process.
+
+The protocol is line based: each line is a JSON object.
+Requests of the client:
+    {"cmd": "start", "difficulty": "Easy"}  start a new game (any of the CONFS)
+    {"cmd": "answer", "reading": "shigoto", "word": "仕事"}  reading in romaji or hiragana,
+                                        word: optional, the one to pick if several match
+    {"cmd": "give_up"}                  get the joker word (same as Enter with an empty answer)
+    {"cmd": "state"}
+    {"cmd": "quit"}
+The server replies to each request with a {"event": "state", ...} or {"event": "error", ...}
+line, and sends a state by itself when the hint shows up or the time is up.
+
+All the sessions share the dictionary indexes, loaded once (and mmap'd) before serving.
+Dictionary work (validating an answer, searching a joker, looking up a word) runs on a
+thread pool, never on the event loop.
+
+To use more than one core, several processes can serve the connections of the same socket.
+The indexes stay in the data pack, memory-mapped by every process: the pages are shared,
+a process only adds its own sessions and Python objects.
+"""
+import asyncio
+import gc
+import json
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import dictionary
+from .chains import load_chains, target_chain
+from .dictionary import load_resources, lookup_word
+from .engine import CONFS, DEFAULT_CONF_NAME, GameState, compute_game_start, \
+    kanji_meaning_and_grade
+from .profiler import PhaseStats
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+DICTIONARY_WORKERS = 4  # Threads doing the dictionary work of all the sessions of a process
+SERVER_PROCESSES = 1  # Processes serving the connections
+ANSWER_LATENCY_TARGET_MS = 50  # From an answer received to the new state sent
+STATS_PERIOD = 60  # Seconds between two logs of the server stats
+MAX_LINE_LENGTH = 4096  # Longest request accepted, in bytes
+NB_FIRST_TURNS = 64  # First kanjis (with their joker word) new games pick from
+NB_LAST_WORDS = 5  # Number of words of the chain sent with the state
+TIMER_MARGIN = 0.01  # Seconds, for the timer to be over when the session is woken up
+
+
+class Session:
+    """One game of a client. The game state is only used on the dictionary threads."""
+
+    def __init__(self, conf_name, game_start, target_chain=None):
+        self.conf_name = conf_name
+        self.target_chain = target_chain  # Longest chain found by the solver, if any
+        self.preferred_word = None
+        self.state = GameState(CONFS[conf_name], choose_word=self.choose_word, verbose=False,
+                               start=game_start, joker_prefetch=False)
+
+    def choose_word(self, candidates):
+        if self.preferred_word in candidates:
+            return self.preferred_word
+        return candidates[0]
+
+    def play(self, answer=None, preferred_word=None):
+        """Play one step of the game (see GameState.process), and return the new state"""
+        self.preferred_word = preferred_word
+        # There is no frame loop updating the timer: the time may be up since the last step
+        self.state.update_timer()
+        self.state.process(answer)
+        return self.state_message()
+
+    def state_message(self):
+        state = self.state
+        kanji_meaning, kanji_grade = kanji_meaning_and_grade(state.kanji_to_match)
+        last_word = state.words.last_word()
+        last_word_info = None
+        if last_word:
+            record = lookup_word(last_word)
+            last_word_info = {"word": record.word, "kana": record.kana, "sense": record.sense}
+        show_hint = state.timer < state.conf["HINT_TIME"] and state.joker_word_sense
+        message = {
+            "event": "state",
+            "running": state.running,
+            "difficulty": self.conf_name,
+            "kanji": state.kanji_to_match,
+            "kanji_meaning": kanji_meaning,
+            "kanji_grade": kanji_grade,
+            "hp": state.hp,
+            "score": state.score,
+            "combo": state.combo,
+            "best_combo": state.best_combo,
+            "target_chain": self.target_chain.length if self.target_chain else None,
+            "timer": round(state.timer, 1),
+            "hint": state.joker_word_sense if show_hint else None,
+            "message": state.warning_msg,
+            "message_is_error": state.warning_msg_is_error if state.warning_msg else False,
+            "nb_words": len(state.words),
+            "last_words": state.words.last_words(NB_LAST_WORDS),
+            "last_word": last_word_info,
+            "kanjis_counter": state.kanjis_counter_text(),
+        }
+        # Each message is sent once
+        state.clear_warning_msg()
+        return message
+
+    def seconds_to_next_event(self):
+        """Seconds before the hint shows up or the time is up, None if the game is over"""
+        state = self.state
+        if not state.running:
+            return None
+        timer = state.timer - (state.clock() - state.last_update_ts)
+        hint_time = state.conf["HINT_TIME"]
+        # Not shown by the last state sent (the timer was not below it yet)
+        if hint_time > 0 and state.timer >= hint_time:
+            timer -= hint_time
+        return max(timer, 0) + TIMER_MARGIN
+
+
+class Connection:
+    """A client connected to the server, playing one session at a time"""
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.session = None
+
+    async def run(self):
+        await self.send({"event": "hello", "difficulties": list(CONFS.keys())})
+        while True:
+            timeout = self.session.seconds_to_next_event() if self.session else None
+            try:
+                line = await asyncio.wait_for(self.reader.readline(), timeout)
+            except asyncio.TimeoutError:
+                await self.send(await self.server.run_in_executor(self.session.play))
+                continue
+            except ValueError:
+                # Longer than MAX_LINE_LENGTH
+                await self.send_error("Request too long")
+                return
+            if not line:
+                return
+
+            received_ts = time.perf_counter()
+            try:
+                request = json.loads(line)
+                cmd = request["cmd"]
+            except (ValueError, TypeError, KeyError):
+                await self.send_error("Invalid request, expected a JSON object with a 'cmd'")
+                continue
+            if cmd == "quit":
+                return
+            await self.handle_request(cmd, request)
+            if cmd in ("answer", "give_up"):
+                self.server.add_answer_latency(time.perf_counter() - received_ts)
+
+    async def handle_request(self, cmd, request):
+        if cmd == "start":
+            conf_name = request.get("difficulty", DEFAULT_CONF_NAME)
+            if not isinstance(conf_name, str) or conf_name not in CONFS:
+                await self.send_error(f"Unknown difficulty {conf_name!r}")
+                return
+            self.session = await self.server.run_in_executor(
+                Session, conf_name, self.server.game_starts[conf_name],
+                self.server.target_chains[conf_name])
+            await self.send(await self.server.run_in_executor(self.session.state_message))
+        elif self.session is None:
+            await self.send_error("No game, start one first")
+        elif cmd == "answer":
+            reading = request.get("reading")
+            if not isinstance(reading, str) or not reading:
+                await self.send_error("The answer needs a 'reading'")
+                return
+            await self.send(await self.server.run_in_executor(
+                self.session.play, reading.lower(), request.get("word")))
+        elif cmd == "give_up":
+            await self.send(await self.server.run_in_executor(self.session.play, ""))
+        elif cmd == "state":
+            await self.send(await self.server.run_in_executor(self.session.play))
+        else:
+            await self.send_error(f"Unknown command {cmd!r}")
+
+    async def send(self, message):
+        self.writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        await self.writer.drain()
+
+    async def send_error(self, error):
+        await self.send({"event": "error", "message": error})
+
+
+class GameServer:
+    """Server of one process, listening to host:port or to an already bound socket"""
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, nb_workers=DICTIONARY_WORKERS,
+                 sock=None):
+        self.host = host
+        self.port = port
+        self.sock = sock
+        self.name = f"Process {os.getpid()}: " if sock is not None else ""
+        self.executor = ThreadPoolExecutor(max_workers=nb_workers,
+                                           thread_name_prefix="dictionary")
+        self.game_starts = {}  # Shared by all the sessions: conf name -> GameStart
+        self.target_chains = {}  # Conf name -> Chain to beat, if the chains were solved
+        self.server = None
+        self.connections = {}  # Task serving each connected client -> its writer
+        self.nb_connections = 0
+        self.answer_latencies = PhaseStats()
+        self.nb_late_answers = 0
+
+    async def run_in_executor(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def start(self):
+        """Load the dictionary, then listen to clients"""
+        await self.run_in_executor(load_resources)
+        chains = await self.run_in_executor(load_chains)
+        for conf_name, conf in CONFS.items():
+            self.game_starts[conf_name] = await self.run_in_executor(
+                compute_game_start, conf, NB_FIRST_TURNS)
+            self.target_chains[conf_name] = target_chain(conf["TARGET_KANJI_GRADE"], chains)
+        if self.sock is not None:
+            self.server = await asyncio.start_server(self.handle_client, sock=self.sock,
+                                                     limit=MAX_LINE_LENGTH)
+            print(f"{self.name}ready")
+        else:
+            self.server = await asyncio.start_server(self.handle_client, self.host, self.port,
+                                                     limit=MAX_LINE_LENGTH)
+            self.port = self.server.sockets[0].getsockname()[1]
+            print(f"Serving on {self.host}:{self.port}")
+
+    async def serve_forever(self):
+        await self.start()
+        stats_task = asyncio.create_task(self.log_stats_periodically())
+        try:
+            await self.server.serve_forever()
+        finally:
+            stats_task.cancel()
+            self.close()
+            if self.connections:
+                # Disconnected: let the tasks of the clients end before the loop is stopped
+                await asyncio.wait(list(self.connections))
+
+    def close(self):
+        """Stop listening, and disconnect the clients"""
+        if self.server is not None:
+            self.server.close()
+        for writer in self.connections.values():
+            writer.close()
+        self.executor.shutdown(wait=False)
+        print(self.stats_text())
+
+    async def handle_client(self, reader, writer):
+        self.nb_connections += 1
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            await Connection(self, reader, writer).run()
+        except ConnectionError:
+            pass
+        finally:
+            self.nb_connections -= 1
+            del self.connections[task]
+            writer.close()
+
+    def add_answer_latency(self, latency):
+        self.answer_latencies.add(latency)
+        if latency * 1000 > ANSWER_LATENCY_TARGET_MS:
+            self.nb_late_answers += 1
+
+    async def log_stats_periodically(self):
+        while True:
+            await asyncio.sleep(STATS_PERIOD)
+            print(self.stats_text())
+
+    def stats_text(self):
+        stats = self.answer_latencies
+        text = (
+            f"{self.name}{self.nb_connections} clients, {stats.count} answers: "
+            f"p50 {stats.percentile(0.5) * 1000:.1f}ms p95 {stats.percentile(0.95) * 1000:.1f}ms "
+            f"max {stats.max * 1000:.1f}ms, {self.nb_late_answers} over the "
+            f"{ANSWER_LATENCY_TARGET_MS}ms target"
+        )
+        memory = private_memory()
+        if memory is not None:
+            text += f", {memory / 2 ** 20:.0f}MB of private memory"
+        return text
+
+
+def private_memory():
+    """Memory of this process not shared with other processes (in bytes), None if unknown"""
+    try:
+        with open("/proc/self/smaps_rollup") as infile:
+            lines = infile.readlines()
+    except OSError:
+        return None
+    nb_kbytes = 0
+    for line in lines:
+        if line.startswith(("Private_Clean:", "Private_Dirty:")):
+            nb_kbytes += int(line.split()[1])
+    return nb_kbytes * 1024
+
+
+def serve(host=None, port=None, nb_workers=None, nb_processes=None):
+    """Run a server until interrupted, the arguments default to the constants above"""
+    host = SERVER_HOST if host is None else host
+    port = SERVER_PORT if port is None else port
+    nb_workers = DICTIONARY_WORKERS if nb_workers is None else nb_workers
+    nb_processes = SERVER_PROCESSES if nb_processes is None else nb_processes
+    if nb_processes > 1:
+        serve_processes(host, port, nb_workers, nb_processes)
+        return
+
+    try:
+        asyncio.run(GameServer(host, port, nb_workers).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+def serve_processes(host, port, nb_workers, nb_processes):
+    """Serve from several forked processes, accepting the connections of the same socket"""
+    # Built if needed before forking, rather than by each process
+    dictionary.DATA_PACK.get()
+    sock = socket.create_server((host, port))
+    print(f"Serving on {host}:{sock.getsockname()[1]} with {nb_processes} processes")
+
+    # The garbage collector of the processes would write to (and copy) the objects of the parent
+    gc.freeze()
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=run_server_process, args=(sock, nb_workers))
+                 for _ in range(nb_processes)]
+    for process in processes:
+        process.start()
+    sock.close()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # The processes were interrupted as well, they exit once their stats are logged
+        for process in processes:
+            process.join()
+
+
+def run_server_process(sock, nb_workers):
+    # The SQLite connections of the parent process can't be used by this one
+    dictionary.JMD.reset()
+    try:
+        asyncio.run(GameServer(nb_workers=nb_workers, sock=sock).serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,159 @@
+import struct
+from array import array
+
+MAGIC = b"KGST"
+VERSION = 1
+HEADER = struct.Struct("<4sII")  # magic, version, number of strings
+
+
+class StringTable:
+    """
+    Sorted table of UTF-8 strings, each one mapped to an unsigned integer value.
+
+    The table is searched in place with a binary search: it is a section of the memory-mapped
+    data pack, so opening it costs nothing and the strings never become Python objects
+    until they are looked up.
+
+    Layout (native byte order for the arrays):
+        header | offsets: uint32[n + 1] | values: uint32[n] | UTF-8 strings, sorted bytewise
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        magic, version, self.size = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a string table (version {VERSION}) !")
+
+        offsets_start = HEADER.size
+        values_start = offsets_start + 4 * (self.size + 1)
+        self.strings_start = values_start + 4 * self.size
+        self.offsets = self.buffer[offsets_start:values_start].cast("I")
+        self.values = self.buffer[values_start:self.strings_start].cast("I")
+
+    def __len__(self):
+        return self.size
+
+    def _raw_string(self, idx):
+        start = self.strings_start + self.offsets[idx]
+        end = self.strings_start + self.offsets[idx + 1]
+        return self.buffer[start:end].tobytes()
+
+    def string(self, idx):
+        return self._raw_string(idx).decode("utf-8")
+
+    def _lower_bound(self, key, lo=0, hi=None):
+        """Position of the first string not lower than the UTF-8 key (between lo and hi)"""
+        hi = self.size if hi is None else hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw_string(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def index(self, string):
+        """Position of the string in the table, or -1 if it is missing"""
+        key = string.encode("utf-8")
+        idx = self._lower_bound(key)
+        if idx < self.size and self._raw_string(idx) == key:
+            return idx
+        return -1
+
+    def indexes(self, strings):
+        """
+        Positions of many strings in the table (-1 for the missing ones), in one pass:
+        the strings are searched in sorted order, each one from the position of the previous
+        one and with steps doubling at each miss, so a close string takes a few comparisons.
+        """
+        positions = [-1] * len(strings)
+        lo = 0
+        for key, string_idx in sorted((string.encode("utf-8"), string_idx)
+                                      for string_idx, string in enumerate(strings)):
+            # The strings before lo are lower than the key, and the one at hi isn't
+            hi = lo
+            step = 1
+            while hi < self.size and self._raw_string(hi) < key:
+                lo = hi + 1
+                hi += step
+                step *= 2
+            lo = self._lower_bound(key, lo, min(hi, self.size))
+            if lo < self.size and self._raw_string(lo) == key:
+                positions[string_idx] = lo
+        return positions
+
+    def prefix_range(self, prefix):
+        """Positions (start, end) of the strings starting with the prefix, as they are sorted"""
+        key = prefix.encode("utf-8")
+        # 0xff never appears in UTF-8: it sorts after any string starting with the prefix
+        return self._lower_bound(key), self._lower_bound(key + b"\xff")
+
+    def get(self, string, default=None):
+        idx = self.index(string)
+        if idx < 0:
+            return default
+        return self.values[idx]
+
+
+class ArrayTable:
+    """
+    Arrays of unsigned integers keyed by string, e.g. the ids of the words of each kanji.
+
+    A string table maps each string to the start of its items in one flat array: as the strings
+    and their items are in the same order, the items of a string end where the next ones start.
+    Lookups return slices of the (memory-mapped) array, nothing is copied.
+    """
+
+    def __init__(self, strings, items):
+        self.strings = strings
+        self.items = items  # uint32 memoryview
+
+    def __len__(self):
+        return len(self.strings)
+
+    def items_at(self, idx):
+        """Items of the string at the given position of the string table"""
+        starts = self.strings.values
+        end = starts[idx + 1] if idx + 1 < len(starts) else len(self.items)
+        return self.items[starts[idx]:end]
+
+    def get(self, string, default=()):
+        idx = self.strings.index(string)
+        if idx < 0:
+            return default
+        return self.items_at(idx)
+
+    def get_many(self, strings, default=()):
+        """Items of each string, looked up in one pass (see StringTable.indexes)"""
+        return [self.items_at(idx) if idx >= 0 else default
+                for idx in self.strings.indexes(strings)]
+
+
+def to_bytes(string_to_value):
+    """Serialize a {string: value} mapping into a StringTable buffer"""
+    encoded = sorted((string.encode("utf-8"), value) for string, value in string_to_value.items())
+
+    offsets = array("I", [0])
+    values = array("I")
+    strings = bytearray()
+    for raw_string, value in encoded:
+        strings += raw_string
+        offsets.append(len(strings))
+        values.append(value)
+
+    return (
+        HEADER.pack(MAGIC, VERSION, len(encoded))
+        + offsets.tobytes()
+        + values.tobytes()
+        + bytes(strings)
+    )
+
+
+def array_table_to_bytes(string_to_items):
+    """Serialize a {string: unsigned integers} mapping into ArrayTable (strings, items) buffers"""
+    starts = {}
+    items = array("I")
+    for string in sorted(string_to_items, key=lambda string: string.encode("utf-8")):
+        starts[string] = len(items)
+        items.extend(string_to_items[string])
+    return to_bytes(starts), items.tobytes()
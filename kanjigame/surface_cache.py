@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class TextSurfaceCache:
+    """
+    Bounded LRU cache of rendered text surfaces, keyed by (font, text, color).
+
+    Most of the texts on screen only change once per turn (or once per second for the timer),
+    so rendering them through the cache avoids rasterizing the same glyphs on every frame.
+    Surfaces are shared: callers must not draw on them.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surf
+
+        self.misses += 1
+        surf = font.render(text, True, color)
+        self.add(key, surf)
+        return surf
+
+    def shade(self, size, alpha=None):
+        """Black surface of the given size, to darken or erase parts of the screen"""
+        key = ("shade", size, alpha)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surf
+
+        self.misses += 1
+        surf = pygame.Surface(size)
+        surf.fill(0)
+        if alpha is not None:
+            surf.set_alpha(alpha)
+        self.add(key, surf)
+        return surf
+
+    def add(self, key, surf):
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def stats_text(self):
+        nb_renders = self.hits + self.misses
+        hit_rate = self.hits / nb_renders if nb_renders else 0
+        return (
+            f"Text surface cache: {self.hits} hits, {self.misses} misses "
+            f"({hit_rate:.1%} hit rate), {self.evictions} evictions, "
+            f"{len(self.surfaces)}/{self.max_size} surfaces"
+        )
@@ -0,0 +1,83 @@
+"""
+Snapshot of what a new game starts with, so that the next launch does not compute it again:
+the candidate kanjis of each difficulty, a few first kanjis with their joker word, and the path
+of the font. It is written once the dictionary is loaded, and used by the next launch if the
+data pack and the game settings did not change in the meantime.
+"""
+import os
+import pickle
+from typing import Optional
+
+from . import dictionary, engine
+from .engine import GameStart
+
+SNAPSHOT_FILENAME = "warm_start"  # In the data folder
+SNAPSHOT_VERSION = 1  # To increase when the content of the snapshot changes
+NB_FIRST_TURNS = 16  # First kanjis (with their joker word) to pick from, for each difficulty
+
+
+def game_settings():
+    """Settings of the game the snapshot depends on"""
+    return (
+        engine.MATCH_LAST_KANJI, engine.JOKER_WORD_POOL_SIZE, engine.WORDS_MIN_NB_KANJI,
+        engine.WORDS_MIN_LENGTH,
+        sorted((conf_name, conf["TARGET_KANJI_GRADE"]) for conf_name, conf in engine.CONFS.items()),
+    )
+
+
+def data_key(pack):
+    return pack.data_version, pack.source_fingerprint
+
+
+def write_snapshot(font_path, filepath=None):
+    """Compute the start of a game for each difficulty, and write them with the font path"""
+    filepath = filepath or dictionary.data_filepath(SNAPSHOT_FILENAME)
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "settings": game_settings(),
+        "data": data_key(dictionary.DATA_PACK.get()),
+        "font_path": font_path,
+        "game_starts": {
+            conf_name: engine.compute_game_start(conf, NB_FIRST_TURNS)
+            for conf_name, conf in engine.CONFS.items()
+        },
+    }
+    dictionary.ensure_data_folder()
+    tmp_filepath = filepath + ".tmp"
+    with open(tmp_filepath, "wb") as outfile:
+        pickle.dump(snapshot, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_filepath, filepath)
+
+
+def load_snapshot(filepath=None) -> Optional[dict]:
+    """The snapshot written by a previous launch, None if there is none for these settings"""
+    filepath = filepath or dictionary.data_filepath(SNAPSHOT_FILENAME)
+    try:
+        with open(filepath, "rb") as infile:
+            snapshot = pickle.load(infile)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring the warm start snapshot ({e!r})")
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION or snapshot["settings"] != game_settings():
+        return None
+    return snapshot
+
+
+def snapshot_font_path(snapshot) -> Optional[str]:
+    if snapshot is None or not snapshot["font_path"]:
+        return None
+    if not os.path.exists(snapshot["font_path"]):
+        return None
+    return snapshot["font_path"]
+
+
+def snapshot_game_start(snapshot, conf_name) -> Optional[GameStart]:
+    """
+    Start of a game of the given difficulty, None if the snapshot was computed from another
+    data pack. Loads the data pack if it is not loaded yet.
+    """
+    if snapshot is None or snapshot["data"] != data_key(dictionary.DATA_PACK.get()):
+        return None
+    return snapshot["game_starts"].get(conf_name)
@@ -0,0 +1,20 @@
+import pytest
+
+from benchmarks.run import import_fixture_db, use_fixture
+from kanjigame import dictionary
+
+
+@pytest.fixture(scope="session")
+def fixture_dictionary(tmp_path_factory):
+    """Load the resources of the game from the fixture dictionary, in a temporary data folder"""
+    workdir = str(tmp_path_factory.mktemp("kanjigame"))
+    import_fixture_db(workdir)
+    data_folder = dictionary.DATA_FOLDER
+    jmd = dictionary.JMD
+    use_fixture(workdir)
+    try:
+        dictionary.load_resources()
+        yield
+    finally:
+        dictionary.set_data_folder(data_folder)
+        dictionary.JMD = jmd
@@ -0,0 +1,39 @@
+from kanjigame import chains, engine
+from kanjigame.engine import KANJI_GRADES
+
+MAX_STATES = 500
+
+
+def replay(chain, grade):
+    """Play the words of the chain in a game, checking each one is accepted, return the state"""
+    conf = dict(engine.CONFS["Easy"], TARGET_KANJI_GRADE=grade)
+    state = engine.GameState(conf, verbose=False, joker_prefetch=False)
+    state.kanji_to_match = chain.first_kanji
+    for word in chain.words:
+        assert word not in state.words, (word, chain)
+        assert state.valid_word_candidate(word) == (True, None), (word, chain)
+        # Answered before the hint, as scored by the solver
+        state.timer = state.conf["MAX_TIMER"]
+        state.add_word(word)
+    return state
+
+
+def test_solved_chains_can_be_played(fixture_dictionary, tmp_path):
+    filepath = str(tmp_path / "chains.json")
+    chains.solve(nb_processes=2, max_states=MAX_STATES, filepath=filepath)
+    solved = chains.load_chains(filepath)
+    assert solved is not None
+
+    for grade in KANJI_GRADES:
+        results = solved["grades"][str(grade)]
+        longest = chains.Chain(**results["longest"])
+        best_score = chains.Chain(**results["best_score"])
+        assert longest.length >= best_score.length
+        assert best_score.score >= longest.score
+        for chain in (longest, best_score):
+            assert chain.length == len(chain.words) > 0
+            assert len(set(chain.words)) == len(chain.words), chain
+            state = replay(chain, grade)
+            assert state.best_combo == chain.length
+            assert state.score == chain.score
+        assert chains.target_chain(grade, solved) == longest
@@ -0,0 +1,53 @@
+import random
+import string
+
+import romkan
+
+from kanjigame.kana_input import LATIN_PATTERN, VOWELS, KanaInput
+
+NB_KEY_SEQUENCES = 20000
+BACKSPACE = None
+
+
+def random_keys(rng):
+    # Mostly syllables, with random letters and backspaces in between
+    keys = []
+    for _ in range(rng.randint(1, 12)):
+        roll = rng.random()
+        if roll < 0.6:
+            keys.extend(rng.choice(string.ascii_lowercase.replace("q", "")) + rng.choice(VOWELS))
+        elif roll < 0.85:
+            keys.append(rng.choice(string.ascii_lowercase))
+        else:
+            keys.append(BACKSPACE)
+    return keys
+
+
+def test_matches_romkan_on_random_key_sequences():
+    rng = random.Random(17)
+    kana_input = KanaInput()
+    for _ in range(NB_KEY_SEQUENCES):
+        kana_input.clear()
+        for key in random_keys(rng):
+            if key is BACKSPACE:
+                kana_input.backspace()
+            else:
+                kana_input.append(key)
+            romaji = kana_input.romaji
+            assert kana_input.kana == (romkan.to_hiragana(romaji) if romaji else "")
+            settled = romaji[:max(romaji.rfind(vowel) for vowel in VOWELS) + 1]
+            assert kana_input.invalid == bool(LATIN_PATTERN.search(romkan.to_hiragana(settled)))
+            assert bool(kana_input) == bool(romaji)
+
+
+def test_backspace_on_empty_input():
+    kana_input = KanaInput()
+    kana_input.backspace()
+    assert kana_input.romaji == kana_input.kana == ""
+    for char in "kanji":
+        kana_input.append(char)
+    assert kana_input.kana == "かんじ"
+    for _ in range(len("kanji") + 2):
+        kana_input.backspace()
+    assert not kana_input
+    assert kana_input.kana == ""
@@ -0,0 +1,40 @@
+import random
+from itertools import chain
+
+from kanjigame.dictionary import READING_TO_WORDS, kanjis_by_grade, reading_has_words
+
+NB_PREFIXES = 600
+
+
+def test_reading_has_words_matches_brute_force(fixture_dictionary):
+    rng = random.Random(18)
+    graded_kanjis = sorted(set(chain.from_iterable(kanjis_by_grade().values())))
+    reading_to_kanjis = {False: {}, True: {}}
+    for reading, records in READING_TO_WORDS.get().items():
+        words = {record.word for record in records}
+        reading_to_kanjis[False][reading] = set(chain.from_iterable(words))
+        reading_to_kanjis[True][reading] = {word[0] for word in words}
+
+    readings = sorted(reading_to_kanjis[False])
+    prefixes = {reading[:rng.randint(1, len(reading))]
+                for reading in rng.sample(readings, NB_PREFIXES)}
+    # Prefixes of no reading, and the empty prefix
+    prefixes.update(prefix + "ゔ" for prefix in rng.sample(sorted(prefixes), 50))
+    prefixes.add("")
+
+    nb_has_words = 0
+    for prefix in sorted(prefixes):
+        for match_last_kanji, kanjis_of_reading in reading_to_kanjis.items():
+            expected = set().union(*(kanjis for reading, kanjis in kanjis_of_reading.items()
+                                     if reading.startswith(prefix)))
+            kanjis = rng.sample(graded_kanjis, 20) + sorted(expected & set(graded_kanjis))[:20]
+            for kanji in kanjis:
+                has_words = reading_has_words(kanji, prefix, match_last_kanji)
+                assert has_words == (kanji in expected), (kanji, prefix, match_last_kanji)
+                nb_has_words += has_words
+    assert nb_has_words > 0
+
+
+def test_unknown_kanji_has_no_words(fixture_dictionary):
+    assert not reading_has_words("a", "", False)
+    assert not reading_has_words("a", "", True)
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from kanjigame import engine
+from kanjigame.dictionary import READING_TO_WORDS, kanji_word_ids, word_table, word_to_freqrank
+
+NB_KANJIS = 40
+NB_RANDOM_READINGS = 300
+NB_KANJI_READINGS = 200
+# (MATCH_LAST_KANJI, WORDS_MIN_LENGTH, WORDS_MIN_NB_KANJI): the defaults, then stricter rules
+WORD_RULES = [(False, 1, 1), (True, 3, 2)]
+
+
+def reference_validation(state, reading):
+    """(valid, candidates, error) of a reading, as GameState.process_validated_user_input sees it"""
+    kana = engine.to_hiragana(reading)
+    if engine.LATIN_PATTERN.search(kana):
+        return False, [], engine.INVALID_INPUT
+    entries, errors = state.lookup_word_entries(kana)
+    if not entries:
+        return False, [], engine.WORD_ERRORS[sorted(errors)[0][0]] if errors else engine.NO_MATCH
+    words = [word for word in entries if word not in state.words]
+    if not words:
+        return False, [], engine.ALREADY_USED
+    return True, sorted(words, key=word_to_freqrank), None
+
+
+@pytest.mark.parametrize("match_last_kanji, min_length, min_nb_kanji", WORD_RULES)
+def test_validate_readings_matches_lookup_word_entries(
+        fixture_dictionary, monkeypatch, match_last_kanji, min_length, min_nb_kanji):
+    monkeypatch.setattr(engine, "MATCH_LAST_KANJI", match_last_kanji)
+    monkeypatch.setattr(engine, "WORDS_MIN_LENGTH", min_length)
+    monkeypatch.setattr(engine, "WORDS_MIN_NB_KANJI", min_nb_kanji)
+    rng = random.Random(24)
+    state = engine.GameState(engine.CONFS["Normal"], verbose=False, joker_prefetch=False)
+    reading_to_words = READING_TO_WORDS.get()
+    readings = sorted(reading_to_words)
+    kanjis = rng.sample(sorted(state.playable_kanjis), NB_KANJIS)
+    # The most frequent word of each kanji is already used
+    _word_table = word_table()
+    for kanji in kanjis:
+        state.words.append(_word_table.word(kanji_word_ids(kanji)[0]))
+
+    errors = set()
+    for kanji in kanjis:
+        state.kanji_to_match = kanji
+        kanji_readings = [reading for reading in readings
+                          if any(kanji in record.word for record in reading_to_words[reading])]
+        sample = (rng.sample(readings, min(NB_RANDOM_READINGS, len(readings)))
+                  + kanji_readings[:NB_KANJI_READINGS] + ["shigoto", "kanj", "xq"])
+        for reading, validation in zip(sample, state.validate_readings(sample)):
+            assert validation.reading == reading
+            expected = reference_validation(state, reading)
+            assert (validation.valid, validation.candidates, validation.error) == expected, \
+                (kanji, reading)
+            errors.add(validation.error)
+    assert None in errors and engine.ALREADY_USED in errors and engine.NO_MATCH in errors